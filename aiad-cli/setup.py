@@ -38,6 +38,10 @@ setuptools.setup(
       'unsplash = aiad_cli.resolvers.unsplash:UnsplashWallpaperSpecResolver',
       'wallpapershome = aiad_cli.resolvers.wallpapershome:WallpapersHomeSpecResolver',
     ],
+    'aiad_cli.sync': [
+      'index = aiad_cli.sync.index:IndexSyncTarget',
+      'static = aiad_cli.sync.static:StaticSyncTarget',
+    ],
     'console_scripts': [
       'aiad-cli = aiad_cli.__main__:cli',
     ]
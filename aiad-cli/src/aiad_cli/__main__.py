@@ -19,21 +19,34 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
 # IN THE SOFTWARE.
 
+from aiad_cli.catalog import CompactCatalog, deep_getsizeof
 from aiad_cli.core import WallpaperSpec
-from aiad_cli.database import WallpapersDatabase
-from aiad_cli.resolvers import resolve_url
+from aiad_cli.database import Transaction, WallpapersDatabase
+from aiad_cli.journal import JobJournal, JournalMismatchError, Progress
+from aiad_cli.metadata import fetch_spec_metadata
+from aiad_cli.probe import probe_spec
+from aiad_cli.resolvers import resolve_list_url, resolve_url, UnresolvableUrlError
+from aiad_cli.static import StaticBuilder
+from aiad_cli.sync import get_targets, GitError, sync
 from nr.proxy import Proxy
-from typing import Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 import click
 import datetime
+import itertools
 import logging
 import os
 import pkg_resources
+import requests
 import sys
 import termcolor
 
 ENV_FILE = os.path.expanduser('~/.config/aiad-cli.env')
 
+#: The number of units after which a batch job commits its changes and checkpoints its journal.
+JOB_BATCH_SIZE = 50
+
+logger = logging.getLogger(__name__)
+
 
 def parse_date(s: str) -> datetime.date:
   return datetime.datetime.strptime(s, '%Y-%m-%d').date()
@@ -45,16 +58,139 @@ def make_db(channel: str) -> WallpapersDatabase:
   return WallpapersDatabase(os.path.join('Wallpapers', channel))
 
 
-def load_spec(url: str, name: Optional[str], keywords: Optional[str]) -> WallpaperSpec:
-  spec = resolve_url(url)
+def next_date(db: WallpapersDatabase) -> datetime.date:
+  date = next(db.all(reverse=True), None)
+  if date:
+    return date + datetime.timedelta(days=1)
+  return datetime.date.today()
+
+
+def prepare_spec(
+  spec: WallpaperSpec,
+  name: Optional[str],
+  keywords: Optional[str],
+  metadata: bool = False,
+  hash: bool = False,
+  probe: bool = False,
+) -> WallpaperSpec:
+  if probe:
+    probe_spec(spec)
   spec.normalize()
+  if metadata or hash:
+    fetch_spec_metadata(spec, hash)
   if name:
     spec.name = name
   if keywords:
-    spec.keywords = map(str.strip, keywords.lower().split(','))
+    spec.keywords = list(map(str.strip, keywords.lower().split(',')))
   return spec
 
 
+def load_spec(
+  url: str,
+  name: Optional[str],
+  keywords: Optional[str],
+  metadata: bool = False,
+  hash: bool = False,
+  probe: bool = False,
+) -> WallpaperSpec:
+  return prepare_spec(resolve_url(url), name, keywords, metadata, hash, probe)
+
+
+def default_journal(command: str, channel: str) -> str:
+  return os.path.join('.aiad-jobs', '{}-{}.jsonl'.format(command, channel))
+
+
+def open_journal(filename: str, key: Dict[str, Any], resume: bool) -> JobJournal:
+  try:
+    return JobJournal(filename, key, resume)
+  except JournalMismatchError as exc:
+    sys.exit('error: {}'.format(exc))
+
+
+def run_job(
+  journal: JobJournal,
+  db: WallpapersDatabase,
+  items: Iterable[Any],
+  func: Callable[[Any, Transaction], Dict[str, Any]],
+  total: Optional[int] = None,
+  unit: Callable[[Any], str] = str,
+  batch_size: int = JOB_BATCH_SIZE,
+) -> None:
+  """
+  Calls *func* with every item that is not marked as done in the *journal* and a #Transaction
+  of the *db*. The transaction is committed every *batch_size* units, and only then are the
+  units of that batch recorded as done in the journal. Failed items are recorded and retried
+  when the job is resumed. The journal is deleted once all items completed successfully.
+
+  If the job is interrupted or *items* raises an error, e.g. when fetching the next page of a
+  list fails, the units that were completed so far are committed before exiting.
+
+  *func* may return a `status` of `skipped` for items that should not be retried.
+  """
+
+  if isinstance(items, list):
+    items = [x for x in items if not journal.is_done(unit(x))]
+    total = len(items)
+  elif total is not None:
+    total = max(total - journal.count_done(), 0)
+  progress = Progress(total)
+  txn = db.transaction()
+  batch = []  # type: List[Tuple[str, Dict[str, Any]]]
+  failed = 0
+
+  def _commit() -> None:
+    try:
+      txn.commit()
+    except BaseException:
+      # The transaction rolled back the batch, so its units are repeated on resume.
+      del batch[:]
+      raise
+    for name, data in batch:
+      journal.record(name, **data)
+    journal.sync()
+    del batch[:]
+
+  try:
+    try:
+      for item in items:
+        name = unit(item)
+        if journal.is_done(name):
+          continue
+        try:
+          data = func(item, txn)
+        except Exception as exc:
+          logger.debug('Unit %s failed.', name, exc_info=True)
+          journal.record(name, 'failed', error=str(exc))
+          progress.step(termcolor.colored('{} failed: {}'.format(name, exc), 'red'))
+          failed += 1
+          continue
+        batch.append((name, data))
+        filename = data.get('filename')
+        if data.get('status') == 'skipped':
+          progress.step(termcolor.colored('Skipped {} ({})'.format(name, data.get('reason')), 'yellow'))
+        else:
+          progress.step(termcolor.colored(os.path.relpath(filename), 'cyan') if filename else name)
+        if len(batch) >= batch_size:
+          _commit()
+    finally:
+      _commit()
+  except KeyboardInterrupt:
+    journal.close()
+    sys.exit('interrupted, run again with --resume to continue.')
+  except SystemExit:
+    journal.close()
+    raise
+  except Exception as exc:
+    logger.debug('Job failed.', exc_info=True)
+    journal.close()
+    sys.exit('error: {}, run again with --resume to continue.'.format(exc))
+
+  if failed:
+    journal.close()
+    sys.exit('error: {} unit(s) failed, run again with --resume to retry them.'.format(failed))
+  journal.discard()
+
+
 @click.group()
 @click.option('-v', '--verbose', is_flag=True)
 @click.option('-q', '--quiet', is_flag=True)
@@ -82,63 +218,212 @@ def cli(verbose, quiet):
 @click.option('-k', '--keywords', help='Override the wallpaper keywords with a comma-separated list.')
 @click.option('-d', '--date', type=parse_date, help='Specify the date for which to save the wallpaper.')
 @click.option('-f', '--force', is_flag=True, help='Force save if the image for the day already exists.')
-def _cli_save(url, channel, name, keywords, date, force):
+@click.option('-m', '--metadata', is_flag=True, help='Capture the size and ETag of every image.')
+@click.option('--hash', is_flag=True, help='Download every image to capture its size and SHA-256 hash.')
+@click.option('-p', '--probe', is_flag=True, help='Read the true dimensions from the image headers.')
+def _cli_save(url, channel, name, keywords, date, force, metadata, hash, probe):
   """
   Resolve a URL and save it as the next daily wallpaper.
   """
 
   db = Proxy(lambda: make_db(channel), lazy=True)
-  spec = Proxy(lambda: load_spec(url, name, keywords), lazy=True)
+  spec = Proxy(lambda: load_spec(url, name, keywords, metadata, hash, probe), lazy=True)
 
   if not date:
-    date = next(db.all(reverse=True), None)
-    if date:
-      date = date + datetime.timedelta(days=1)
-    else:
-      date = datetime.date.today()
+    date = next_date(db)
 
-  if db.exists(date):
-    if not force:
-      sys.exit('error: wallpaper for date "{}" already exists.'.format(date))
-    filename = db.delete(date)
-    print('Deleted', termcolor.colored(os.path.relpath(filename), 'red'))
+  exists = db.exists(date)
+  if exists and not force:
+    sys.exit('error: wallpaper for date "{}" already exists.'.format(date))
 
   if not spec.name:
     sys.exit('error: resolved wallpaper spec has no name, please specify -n,--name')
   if not spec.keywords:
     sys.exit('error: resolved wallpaper spec has no keywords, please specify -k,--keywords')
 
+  # Saving replaces an existing spec for the same date in one step.
   filename = db.save(date, spec)
-  print('Saved to', termcolor.colored(os.path.relpath(filename), 'cyan'))
+  print('Replaced' if exists else 'Saved to', termcolor.colored(os.path.relpath(filename), 'cyan'))
 
 
 @cli.command('resave')
 @click.argument('dates', nargs=-1, type=parse_date)
 @click.option('-c', '--channel', default='General', help='The database channel. Defaults to "General".')
-def _cli_resave(dates, channel):
+@click.option('-m', '--metadata', is_flag=True, help='Capture the size and ETag of every image.')
+@click.option('--hash', is_flag=True, help='Download every image to capture its size and SHA-256 hash.')
+@click.option('-p', '--probe', is_flag=True, help='Read the true dimensions from the image headers.')
+@click.option('--resume', is_flag=True, help='Skip the units completed by a previous run of the same job.')
+@click.option('--journal', help='The checkpoint file. Defaults to ".aiad-jobs/resave-<channel>.jsonl".')
+def _cli_resave(dates, channel, metadata, hash, probe, resume, journal):
   """
   Re-save the Wallpaper specs for the specified dates.
   """
 
-  db = Proxy(lambda: make_db(channel), lazy=True)
+  db = make_db(channel)
+  units = [date.isoformat() for date in dates]
+  key = {'command': 'resave', 'channel': channel, 'dates': units}
+  journal = open_journal(journal or default_journal('resave', channel), key, resume)
+
+  def _resave(unit: str, txn: Transaction) -> Dict[str, Any]:
+    date = parse_date(unit)
+    spec = db.load(date)
+    keywords = ','.join(spec.keywords)
+    spec = load_spec(spec.source_url, spec.name, keywords, metadata, hash, probe)
+    return {'filename': txn.save(date, spec)}
+
+  run_job(journal, db, units, _resave)
+
+
+@cli.command('import')
+@click.argument('url')
+@click.option('-c', '--channel', default='General', help='The database channel. Defaults to "General".')
+@click.option('-k', '--keywords', help='Override the wallpaper keywords with a comma-separated list.')
+@click.option('-d', '--date', type=parse_date, help='The date for the first wallpaper. Defaults to the next free day.')
+@click.option('-l', '--limit', type=int, help='The maximum number of wallpapers to import.')
+@click.option('-f', '--force', is_flag=True, help='Replace wallpapers for days that already exist.')
+@click.option('-m', '--metadata', is_flag=True, help='Capture the size and ETag of every image.')
+@click.option('--hash', is_flag=True, help='Download every image to capture its size and SHA-256 hash.')
+@click.option('-p', '--probe', is_flag=True, help='Read the true dimensions from the image headers.')
+@click.option('--resume', is_flag=True, help='Skip the units completed by a previous run of the same job.')
+@click.option('--journal', help='The checkpoint file. Defaults to ".aiad-jobs/import-<channel>.jsonl".')
+def _cli_import(url, channel, keywords, date, limit, force, metadata, hash, probe, resume, journal):
+  """
+  Resolve a collection, search or user URL and save its photos for consecutive days.
+
+  Only search pages provide keywords (the search terms), specify -k,--keywords when importing
+  a collection or user page. Photos without keywords are skipped.
+  """
+
+  db = make_db(channel)
+  key = {'command': 'import', 'channel': channel, 'url': url, 'limit': limit,
+    'date': date.isoformat() if date else None}
 
-  specs_to_reload = []
-  for date in dates:
-    specs_to_reload.append((date, db.load(date)))
+  # Fetch the first page before creating the journal to report a bad URL or missing
+  # credentials right away.
+  try:
+    specs = iter(resolve_list_url(url, limit))
+    first = list(itertools.islice(specs, 1))
+  except (UnresolvableUrlError, EnvironmentError, requests.RequestException) as exc:
+    sys.exit('error: {}'.format(exc))
+  journal = open_journal(journal or default_journal('import', channel), key, resume)
 
-  for date, spec in specs_to_reload:
-    spec = load_spec(spec.source_url, spec.name, ','.join(spec.keywords))
-    db.save(date, spec)
+  # Continue after the last day saved by the previous run of this job.
+  saved_dates = [x['date'] for x in journal.entries.values() if x['status'] == 'done']
+  next_day = [parse_date(max(saved_dates)) + datetime.timedelta(days=1) if saved_dates
+    else date or next_date(db)]
+
+  def _import(spec: WallpaperSpec, txn: Transaction) -> Dict[str, Any]:
+    # Check the date first, preparing the spec may download every image.
+    date = next_day[0]
+    if db.exists(date) and not force:
+      sys.exit('error: wallpaper for date "{}" already exists.'.format(date))
+    spec = prepare_spec(spec, None, keywords, metadata, hash, probe)
+    if not spec.keywords:
+      return {'status': 'skipped', 'reason': 'no keywords'}
+    filename = txn.save(date, spec)
+    next_day[0] += datetime.timedelta(days=1)
+    return {'date': date.isoformat(), 'filename': filename}
+
+  run_job(journal, db, itertools.chain(first, specs), _import, total=limit,
+    unit=lambda spec: spec.source_url)
+
+
+@cli.command('backfill')
+@click.argument('dates', nargs=-1, type=parse_date)
+@click.option('-c', '--channel', default='General', help='The database channel. Defaults to "General".')
+@click.option('--hash', is_flag=True, help='Download every image to capture its size and SHA-256 hash.')
+@click.option('-f', '--force', is_flag=True, help='Re-capture metadata that is already present.')
+@click.option('-j', '--jobs', type=int, help='The number of concurrent requests per spec.')
+@click.option('--resume', is_flag=True, help='Skip the units completed by a previous run of the same job.')
+@click.option('--journal', help='The checkpoint file. Defaults to ".aiad-jobs/backfill-<channel>.jsonl".')
+def _cli_backfill(dates, channel, hash, force, jobs, resume, journal):
+  """
+  Capture missing image metadata for the specified dates, or all dates.
+  """
+
+  db = make_db(channel)
+  key = {'command': 'backfill', 'channel': channel, 'hash': hash, 'force': force,
+    'dates': [date.isoformat() for date in dates] or None}
+  units = [date.isoformat() for date in dates or db.all()]
+  journal = open_journal(journal or default_journal('backfill', channel), key, resume)
+
+  def _backfill(unit: str, txn: Transaction) -> Dict[str, Any]:
+    date = parse_date(unit)
+    spec = db.load(date)
+    if fetch_spec_metadata(spec, hash, force, jobs):
+      return {'filename': txn.save(date, spec)}
+    return {}
+
+  run_job(journal, db, units, _backfill)
+
+
+@cli.command('build-static')
+@click.option('-c', '--channel', default='General', help='The database channel. Defaults to "General".')
+@click.option('-o', '--output', default='build/static', help='The output directory. Defaults to "build/static".')
+@click.option('-j', '--jobs', type=int, help='The number of threads to compress files with.')
+def _cli_build_static(channel, output, jobs):
+  """
+  Render a channel into a static tree of pre-compressed JSON files.
+  """
+
+  db = make_db(channel)
+  builder = StaticBuilder(os.path.dirname(db.directory), output, jobs)
+  written = builder.build(channel)
+  print('Wrote', len(written), 'file(s) to', termcolor.colored(os.path.join(output, channel), 'cyan'))
+
+
+@cli.command('catalog-info')
+@click.option('-c', '--channel', default='General', help='The database channel. Defaults to "General".')
+def _cli_catalog_info(channel):
+  """
+  Compare the memory used by the compact catalog with loading all specs.
+  """
+
+  db = make_db(channel)
+  catalog = CompactCatalog.from_database(db)
+  compact = catalog.memory_usage()
+  naive = deep_getsizeof([db.load(date) for date in db.all()])
+  print('Days:    {}'.format(len(catalog)))
+  print('Specs:   {} bytes'.format(naive))
+  print('Compact: {} bytes ({:.1%})'.format(compact, compact / naive if naive else 0))
+
+
+@cli.command('sync')
+@click.option('-o', '--output', default='build', help='The output directory. Defaults to "build".')
+@click.option('-t', '--target', multiple=True, help='The sync target(s) to update. Defaults to all.')
+@click.option('--full', is_flag=True, help='Ignore the last synced commit and rebuild all targets.')
+def _cli_sync(output, target, full):
+  """
+  Update derived artefacts with the specs changed since the last sync.
+  """
+
+  if not os.path.isdir('Wallpapers'):
+    sys.exit('error: directory "Wallpapers" does not exist.')
+
+  try:
+    targets = get_targets(output, target)
+    result = sync('.', output, targets, full)
+  except (GitError, ValueError) as exc:
+    sys.exit('error: {}'.format(exc))
+
+  for name, changes in result.items():
+    if changes is None:
+      print('Rebuilt', termcolor.colored(name, 'cyan'))
+    else:
+      print('Updated', termcolor.colored(name, 'cyan'), '({} changed file(s))'.format(len(changes)))
 
 
 @cli.command('resolve')
 @click.argument('url')
-def _cli_resolve(url):
+@click.option('-m', '--metadata', is_flag=True, help='Capture the size and ETag of every image.')
+@click.option('--hash', is_flag=True, help='Download every image to capture its size and SHA-256 hash.')
+@click.option('-p', '--probe', is_flag=True, help='Read the true dimensions from the image headers.')
+def _cli_resolve(url, metadata, hash, probe):
   """
   Resolve a URL to a Wallpaper spec and dump it as JSON to stdout.
   """
 
-  spec=  load_spec(url, None, None)
+  spec = load_spec(url, None, None, metadata, hash, probe)
   spec.to_json(sys.stdout, indent=2)
   print()
 
@@ -0,0 +1,254 @@
+# -*- coding: utf8 -*-
+# Copyright (c) 2020 Niklas Rosenstein
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+
+"""
+A compact, read-only in-memory representation of a channel of the Wallpapers database for
+long-lived processes. Instead of keeping a #WallpaperSpec object per day, all data is stored
+in a few flat arrays:
+
+* every string is stored once in a string table and referenced by its index,
+* URLs are split into a shared prefix (everything up to the last slash of the path) and a
+  suffix, both of which are interned,
+* resolutions are stored column-wise across all days, and
+* resolution aliases are indices into the resolutions of the same day instead of copies.
+
+#WallpaperSpec objects are materialised on access.
+"""
+
+from aiad_cli.core import ImageCredit, ImageWithResolution, WallpaperSpec
+from aiad_cli.database import WallpapersDatabase
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import bisect
+import datetime
+import sys
+
+#: Marks a missing value in a column of string IDs or sizes.
+_NONE = 0xFFFFFFFF
+
+
+def _split_url(url: str) -> Tuple[str, str]:
+  query_start = url.find('?')
+  index = url.rfind('/', 0, query_start if query_start >= 0 else len(url)) + 1
+  return url[:index], url[index:]
+
+
+def deep_getsizeof(obj: Any) -> int:
+  """
+  Returns the size of *obj* in bytes including all objects it references through containers
+  and instance attributes. Objects that are referenced multiple times are counted once.
+  """
+
+  seen = set()
+  stack = [obj]
+  size = 0
+  while stack:
+    obj = stack.pop()
+    if id(obj) in seen:
+      continue
+    seen.add(id(obj))
+    size += sys.getsizeof(obj)
+    if isinstance(obj, dict):
+      stack.extend(obj.keys())
+      stack.extend(obj.values())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+      stack.extend(obj)
+    if hasattr(obj, '__dict__'):
+      stack.append(obj.__dict__)
+  return size
+
+
+class CompactCatalog:
+  """
+  A read-only mapping of dates to #WallpaperSpec objects. Use #from_database() or
+  #from_specs() to construct it.
+  """
+
+  def __init__(self) -> None:
+    self._strings = []  # type: List[str]
+    self._dates = array('I')
+
+    # Per day columns. Pairs of *_prefix/*_suffix columns form a URL.
+    self._name = array('I')
+    self._source_prefix = array('I')
+    self._source_suffix = array('I')
+    self._credit_text = array('I')
+    self._author = array('I')
+    self._author_prefix = array('I')
+    self._author_suffix = array('I')
+
+    # Keywords, resolutions and aliases of day i are in the range offsets[i]:offsets[i+1].
+    self._keyword_offsets = array('I', [0])
+    self._keywords = array('I')
+    self._resolution_offsets = array('I', [0])
+    self._resolution_counts = array('I')
+    self._height = array('I')
+    self._width = array('I')
+    self._url_prefix = array('I')
+    self._url_suffix = array('I')
+    self._filename = array('I')
+    self._size = array('q')
+    self._etag = array('I')
+    self._sha256 = array('I')
+    self._alias_offsets = array('I', [0])
+    self._alias_names = array('I')
+    self._alias_indices = array('I')
+
+  @classmethod
+  def from_specs(cls, specs: Iterable[Tuple[datetime.date, WallpaperSpec]]) -> 'CompactCatalog':
+    """
+    Creates a catalog from (date, spec) pairs, which must be in ascending order by date.
+    """
+
+    self = cls()
+    string_ids = {}  # type: Dict[str, int]
+
+    def intern(value: str) -> int:
+      try:
+        return string_ids[value]
+      except KeyError:
+        string_ids[value] = len(self._strings)
+        self._strings.append(value)
+        return string_ids[value]
+
+    def intern_url(url: str) -> Tuple[int, int]:
+      prefix, suffix = _split_url(url)
+      return intern(prefix), intern(suffix)
+
+    for date, spec in specs:
+      ordinal = date.toordinal()
+      if self._dates and ordinal <= self._dates[-1]:
+        raise ValueError('specs must be sorted by date')
+      self._dates.append(ordinal)
+      self._name.append(intern(spec.name))
+      prefix, suffix = intern_url(spec.source_url)
+      self._source_prefix.append(prefix)
+      self._source_suffix.append(suffix)
+      self._credit_text.append(intern(spec.credit.text))
+      self._author.append(intern(spec.credit.author))
+      prefix, suffix = intern_url(spec.credit.author_url)
+      self._author_prefix.append(prefix)
+      self._author_suffix.append(suffix)
+
+      self._keywords.extend(intern(x) for x in spec.keywords)
+      self._keyword_offsets.append(len(self._keywords))
+
+      # Aliases usually point to an image that is also in the resolutions. Others are stored
+      # after the day's resolutions, but are not listed in #WallpaperSpec.resolutions.
+      images = list(spec.resolutions)
+      for alias, image in spec.resolution_aliases.items():
+        if image not in images:
+          images.append(image)
+        self._alias_names.append(intern(alias))
+        self._alias_indices.append(images.index(image))
+      self._alias_offsets.append(len(self._alias_names))
+
+      for image in images:
+        self._height.append(image.height)
+        self._width.append(image.width)
+        prefix, suffix = intern_url(image.image_url)
+        self._url_prefix.append(prefix)
+        self._url_suffix.append(suffix)
+        self._filename.append(intern(image.filename))
+        self._size.append(-1 if image.size is None else image.size)
+        self._etag.append(_NONE if image.etag is None else intern(image.etag))
+        self._sha256.append(_NONE if image.sha256 is None else intern(image.sha256))
+      self._resolution_offsets.append(len(self._height))
+      self._resolution_counts.append(len(spec.resolutions))
+
+    return self
+
+  @classmethod
+  def from_database(cls, db: WallpapersDatabase) -> 'CompactCatalog':
+    """
+    Creates a catalog from all specs in *db*. Only one #WallpaperSpec is held in memory at a
+    time while loading.
+    """
+
+    return cls.from_specs((date, db.load(date)) for date in db.all())
+
+  def __len__(self) -> int:
+    return len(self._dates)
+
+  def __contains__(self, date: datetime.date) -> bool:
+    return self._find(date) is not None
+
+  def __iter__(self) -> Iterator[datetime.date]:
+    return (datetime.date.fromordinal(x) for x in self._dates)
+
+  def __getitem__(self, date: datetime.date) -> WallpaperSpec:
+    index = self._find(date)
+    if index is None:
+      raise KeyError(date)
+    return self._materialize(index)
+
+  def _find(self, date: datetime.date) -> Optional[int]:
+    ordinal = date.toordinal()
+    index = bisect.bisect_left(self._dates, ordinal)
+    if index < len(self._dates) and self._dates[index] == ordinal:
+      return index
+    return None
+
+  def _url(self, prefix: int, suffix: int) -> str:
+    return self._strings[prefix] + self._strings[suffix]
+
+  def _materialize(self, index: int) -> WallpaperSpec:
+    strings = self._strings
+    start, end = self._resolution_offsets[index], self._resolution_offsets[index + 1]
+    images = [ImageWithResolution(
+      self._height[i],
+      self._width[i],
+      self._url(self._url_prefix[i], self._url_suffix[i]),
+      strings[self._filename[i]],
+      None if self._size[i] < 0 else self._size[i],
+      None if self._etag[i] == _NONE else strings[self._etag[i]],
+      None if self._sha256[i] == _NONE else strings[self._sha256[i]],
+    ) for i in range(start, end)]
+
+    aliases = {}
+    for i in range(self._alias_offsets[index], self._alias_offsets[index + 1]):
+      aliases[strings[self._alias_names[i]]] = images[self._alias_indices[i]]
+
+    keywords = self._keywords[self._keyword_offsets[index]:self._keyword_offsets[index + 1]]
+    return WallpaperSpec(
+      name=strings[self._name[index]],
+      keywords=[strings[x] for x in keywords],
+      source_url=self._url(self._source_prefix[index], self._source_suffix[index]),
+      credit=ImageCredit(
+        text=strings[self._credit_text[index]],
+        author=strings[self._author[index]],
+        author_url=self._url(self._author_prefix[index], self._author_suffix[index]),
+      ),
+      resolutions=images[:self._resolution_counts[index]],
+      resolution_aliases=aliases,
+    )
+
+  def items(self) -> Iterator[Tuple[datetime.date, WallpaperSpec]]:
+    for index, ordinal in enumerate(self._dates):
+      yield datetime.date.fromordinal(ordinal), self._materialize(index)
+
+  def memory_usage(self) -> int:
+    """
+    Returns the number of bytes used by the catalog, including the string table.
+    """
+
+    return deep_getsizeof(self)
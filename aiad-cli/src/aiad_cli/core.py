@@ -20,10 +20,10 @@
 # IN THE SOFTWARE.
 
 from collections import OrderedDict
-from nr.databind.core import Field, ObjectMapper, Struct
+from nr.databind.core import Field, ObjectMapper, SkipDefaults, Struct
 from nr.databind.json import JsonModule
 from nr.interface import Interface
-from typing import Optional, TextIO, Union
+from typing import Iterable, Optional, TextIO, Union
 import json
 
 MAPPER = ObjectMapper(JsonModule())
@@ -49,6 +49,7 @@ def get_closest_resolution_alias(width: int, height: int) -> Optional[str]:
   return None
 
 
+@SkipDefaults()
 class ImageWithResolution(Struct):
   """
   Represents an actual URL to an image and it's resolution.
@@ -59,6 +60,16 @@ class ImageWithResolution(Struct):
   image_url = Field(str)
   filename = Field(str)
 
+  #: The size of the image in bytes, as reported by the `Content-Length` header or measured
+  #: when the image was downloaded to compute the #sha256.
+  size = Field(int, default=None, nullable=True)
+
+  #: The `ETag` header of the image URL.
+  etag = Field(str, default=None, nullable=True)
+
+  #: The hex encoded SHA-256 hash of the image content.
+  sha256 = Field(str, default=None, nullable=True)
+
 
 class ImageCredit(Struct):
   """
@@ -151,3 +162,21 @@ class IWallpaperSpecResolver(Interface):
     """
     Resolve a URL to a #WallpaperSpec.
     """
+
+
+class IWallpaperListResolver(Interface):
+  """
+  An interface for resolvers that can resolve a URL to a list of photos, such as a collection,
+  search or user page, using the provider's paginated list endpoints.
+  """
+
+  def match_list_url(self, url: str) -> bool:
+    """
+    True if the URL can be resolved to a list of wallpapers.
+    """
+
+  def resolve_list(self, url: str, limit: Optional[int] = None) -> Iterable[WallpaperSpec]:
+    """
+    Resolve a URL to #WallpaperSpec objects, yielding them as the pages of the list arrive.
+    No more than *limit* specs are resolved, if specified.
+    """
@@ -24,11 +24,13 @@ Logic that manages the Wallpapers database directory.
 """
 
 from aiad_cli.core import WallpaperSpec
-from typing import Iterable, List
+from aiad_cli.utils import DEFAULT_FILE_MODE
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 import builtins
 import datetime
 import os
 import re
+import tempfile
 
 
 def _listdir(path: str) -> List[str]:
@@ -38,6 +40,17 @@ def _listdir(path: str) -> List[str]:
     return []
 
 
+def _fsync_directory(path: str) -> None:
+  if os.name != 'posix':
+    # Directories can not be opened for syncing on Windows.
+    return
+  fd = os.open(path, os.O_RDONLY)
+  try:
+    os.fsync(fd)
+  finally:
+    os.close(fd)
+
+
 class DateNotFoundError(ValueError):
   pass
 
@@ -79,6 +92,15 @@ class WallpapersDatabase:
     Iterates over which days have entries in the specified year and month.
     """
 
+    for date, filename in self.files(year, month):
+      yield date.day
+
+  def files(self, year: int, month: int) -> Iterable[Tuple[datetime.date, str]]:
+    """
+    Iterates over the days and their spec filenames in the specified year and month. Unlike
+    calling #get_filename_for_day() for every day, this lists the directory only once.
+    """
+
     valid_days = set('{:0>2}'.format(i) for i in range(1, 32))
     directory = os.path.join(self.directory, '{:0>2}'.format(year), '{:0>2}'.format((month)))
     for name in _listdir(directory):
@@ -91,11 +113,11 @@ class WallpapersDatabase:
         continue
       day = int(day_num.lstrip('0'))
       try:
-        datetime.date(year, month, day)
+        date = datetime.date(year, month, day)
       except ValueError:
         # Not a valid day in the Gregorian calendar.
         continue
-      yield day
+      yield date, os.path.join(directory, name)
 
   def all(
     self,
@@ -114,7 +136,12 @@ class WallpapersDatabase:
         for curr_day in _sort(self.days(curr_year, curr_month)):
           yield datetime.date(curr_year, curr_month, curr_day)
 
-  def _get_filename_for_day(self, date: datetime.date) -> str:
+  def get_filename_for_day(self, date: datetime.date) -> str:
+    """
+    Returns the filename of the spec for the specified *date*. Raises a #DateNotFoundError if
+    there is no spec for that date.
+    """
+
     directory = os.path.join(self.directory, '{:0>2}'.format(date.year), '{:0>2}'.format(date.month))
     if not os.path.isdir(directory):
       raise DateNotFoundError(date)
@@ -128,26 +155,178 @@ class WallpapersDatabase:
 
   def exists(self, date: datetime.date) -> bool:
     try:
-      self._get_filename_for_day(date)
+      self.get_filename_for_day(date)
       return True
     except DateNotFoundError:
       return False
 
   def load(self, date: datetime.date) -> WallpaperSpec:
-    filename = self._get_filename_for_day(date)
+    filename = self.get_filename_for_day(date)
     return WallpaperSpec.from_json(filename)
 
-  def save(self, date: datetime.date, spec: WallpaperSpec) -> str:
+  def get_filename(self, date: datetime.date, spec: WallpaperSpec) -> str:
+    """
+    Returns the filename that *spec* is saved under for the specified *date*.
+    """
+
     filename = os.path.join(self.directory, '{:0>4}'.format(date.year),
       '{:0>2}'.format(date.month), '{:0>2}'.format(date.day))
     if spec.name:
       filename += '-' + re.sub('[^\w\d]+', '-', spec.name.lower())
     filename += '.json'
-    os.makedirs(os.path.dirname(filename), exist_ok=True)
-    spec.to_json(filename, indent=2)
     return filename
 
+  def transaction(self, durable: bool = True) -> 'Transaction':
+    """
+    Returns a new #Transaction for this database. Use it as a context manager to commit the
+    changes on success and discard them if an exception occurs.
+    """
+
+    return Transaction(self, durable)
+
+  def save(self, date: datetime.date, spec: WallpaperSpec) -> str:
+    with self.transaction() as txn:
+      return txn.save(date, spec)
+
+  def save_many(
+    self,
+    items: Iterable[Tuple[datetime.date, WallpaperSpec]],
+    durable: bool = True,
+  ) -> List[str]:
+    """
+    Saves all (date, spec) pairs in *items* in a single #Transaction and returns the filenames.
+    """
+
+    with self.transaction(durable) as txn:
+      return [txn.save(date, spec) for date, spec in items]
+
   def delete(self, date: datetime.date) -> str:
-    filename = self._get_filename_for_day(date)
+    filename = self.get_filename_for_day(date)
     os.remove(filename)
     return filename
+
+
+class Transaction:
+  """
+  Collects writes and deletions for a #WallpapersDatabase and applies them on #commit().
+
+  Specs are written to temporary files next to their final location as they are added to the
+  transaction. On commit, every temporary file is renamed into place, replacing an existing
+  file for the same date even if it has a different name, and each modified directory is
+  synced only once. A crash therefore never leaves a truncated spec file behind, at most a
+  stale `.*.tmp` file, which the database ignores. If the commit fails, the changes that were
+  not applied yet are rolled back.
+
+  If *durable* is disabled, no fsync is issued at all. The files are still replaced
+  atomically, but may be lost if the system crashes shortly after the commit.
+  """
+
+  def __init__(self, db: WallpapersDatabase, durable: bool = True) -> None:
+    self.db = db
+    self.durable = durable
+    self._pending = {}  # type: Dict[datetime.date, Tuple[Optional[str], Optional[str]]]
+    self._dirty = set()  # type: Set[str]
+
+  def __enter__(self) -> 'Transaction':
+    return self
+
+  def __exit__(self, exc_type, exc_value, exc_tb) -> None:
+    if exc_type is None:
+      self.commit()
+    else:
+      self.rollback()
+
+  def _discard(self, date: datetime.date) -> None:
+    temp_filename = self._pending.pop(date, (None, None))[0]
+    if temp_filename:
+      os.remove(temp_filename)
+
+  def save(self, date: datetime.date, spec: WallpaperSpec) -> str:
+    """
+    Writes *spec* to a temporary file and schedules it to be saved for the specified *date*.
+    Returns the filename that the spec will have after the commit.
+    """
+
+    filename = self.db.get_filename(date, spec)
+    directory = os.path.dirname(filename)
+    if not os.path.isdir(directory):
+      os.makedirs(directory)
+      self._dirty.add(os.path.dirname(directory))
+      self._dirty.add(os.path.dirname(os.path.dirname(directory)))
+
+    fd, temp_filename = tempfile.mkstemp(prefix='.', suffix='.tmp', dir=directory)
+    try:
+      os.chmod(temp_filename, DEFAULT_FILE_MODE)
+      with os.fdopen(fd, 'w') as fp:
+        spec.to_json(fp, indent=2)
+        if self.durable:
+          fp.flush()
+          os.fsync(fp.fileno())
+    except BaseException:
+      os.remove(temp_filename)
+      raise
+
+    self._discard(date)
+    self._pending[date] = (temp_filename, filename)
+    return filename
+
+  def delete(self, date: datetime.date) -> None:
+    """
+    Schedules the spec for the specified *date* to be deleted. Raises a #DateNotFoundError if
+    the date does not exist in the database.
+    """
+
+    self._discard(date)
+    if not self.db.exists(date):
+      raise DateNotFoundError(date)
+    self._pending[date] = (None, None)
+
+  def commit(self) -> None:
+    """
+    Moves all pending files into place and syncs the affected directories.
+    """
+
+    try:
+      while self._pending:
+        date = next(iter(self._pending))
+        temp_filename, filename = self._pending[date]
+        try:
+          old_filename = self.db.get_filename_for_day(date)
+        except DateNotFoundError:
+          old_filename = None
+
+        if temp_filename is None:
+          if old_filename:
+            os.remove(old_filename)
+            self._dirty.add(os.path.dirname(old_filename))
+        elif old_filename and old_filename != filename:
+          # Replace the contents of the old file first and rename it afterwards, so there
+          # is exactly one file for the date at any point in time.
+          os.replace(temp_filename, old_filename)
+          os.replace(old_filename, filename)
+        else:
+          os.replace(temp_filename, filename)
+        if temp_filename is not None:
+          self._dirty.add(os.path.dirname(filename))
+        del self._pending[date]
+    except BaseException:
+      # Don't leave the temporary files of the changes that were not applied behind.
+      self.rollback()
+      raise
+
+    if self.durable:
+      for directory in builtins.sorted(self._dirty, reverse=True):
+        _fsync_directory(directory)
+    self._dirty.clear()
+
+  def rollback(self) -> None:
+    """
+    Removes all temporary files and discards the pending changes.
+    """
+
+    for date in list(self._pending):
+      try:
+        self._discard(date)
+      except FileNotFoundError:
+        pass
+    self._dirty.clear()
@@ -0,0 +1,148 @@
+# -*- coding: utf8 -*-
+# Copyright (c) 2020 Niklas Rosenstein
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+
+"""
+Checkpointing for long-running batch commands. A #JobJournal records every unit of work that
+was completed, skipped or failed in an append-only file, so that an interrupted job can be resumed
+without repeating the work, and in particular the HTTP requests, that was already done.
+"""
+
+from typing import Any, Dict, Optional, TextIO
+import datetime
+import json
+import os
+import sys
+import time
+
+
+class JournalMismatchError(ValueError):
+  pass
+
+
+class JobJournal:
+  """
+  An append-only journal of units of work, stored as one JSON object per line. The first line
+  describes the job with a *key*, which must match when resuming so that a journal can not
+  accidentally be resumed by a different job.
+
+  Records are flushed as they are written, but only synced to disk on #sync(). Losing a record
+  in a crash merely causes its unit to be processed again.
+  """
+
+  def __init__(self, filename: str, key: Dict[str, Any], resume: bool = False) -> None:
+    self.filename = filename
+    self.key = key
+    self.entries = {}  # type: Dict[str, Dict[str, Any]]
+
+    if resume and os.path.isfile(filename):
+      with open(filename) as fp:
+        self._load(fp)
+      self._fp = open(filename, 'a')
+    else:
+      os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+      self._fp = open(filename, 'w')
+      self._append({'key': key})
+      self.sync()
+
+  def _load(self, fp: TextIO) -> None:
+    try:
+      header = json.loads(fp.readline())
+    except ValueError:
+      header = None
+    if not isinstance(header, dict) or 'key' not in header:
+      raise JournalMismatchError('journal "{}" has no valid header'.format(self.filename))
+    if header['key'] != self.key:
+      raise JournalMismatchError('journal "{}" belongs to a different job: {}'
+        .format(self.filename, header['key']))
+
+    for line in fp:
+      try:
+        entry = json.loads(line)
+      except ValueError:
+        # The last line may be incomplete if the process was killed while writing it.
+        continue
+      self.entries[entry['unit']] = entry
+
+  def _append(self, entry: Dict[str, Any]) -> None:
+    self._fp.write(json.dumps(entry) + '\n')
+    self._fp.flush()
+
+  def is_done(self, unit: str) -> bool:
+    """
+    True if the *unit* was completed or skipped.
+    """
+
+    return self.entries.get(unit, {}).get('status') in ('done', 'skipped')
+
+  def count_done(self) -> int:
+    return sum(1 for unit in self.entries if self.is_done(unit))
+
+  def record(self, unit: str, status: str = 'done', **data: Any) -> None:
+    """
+    Records the *status* (`done`, `skipped` or `failed`) of a unit with optional extra *data*.
+    """
+
+    entry = dict(data, unit=unit, status=status)
+    self.entries[unit] = entry
+    self._append(entry)
+
+  def sync(self) -> None:
+    os.fsync(self._fp.fileno())
+
+  def close(self) -> None:
+    self._fp.close()
+
+  def discard(self) -> None:
+    """
+    Closes and deletes the journal, e.g. after the job completed without failures.
+    """
+
+    self.close()
+    os.remove(self.filename)
+
+
+def _format_duration(seconds: float) -> str:
+  return str(datetime.timedelta(seconds=int(seconds)))
+
+
+class Progress:
+  """
+  Reports the progress and estimated remaining time of a job to *out*, one line per unit.
+  Units that were skipped because they are already done do not count towards the ETA.
+  """
+
+  def __init__(self, total: Optional[int], out: TextIO = None) -> None:
+    self.total = total
+    self.out = out or sys.stderr
+    self.count = 0
+    self._started = time.time()
+
+  def step(self, label: str) -> None:
+    self.count += 1
+    elapsed = time.time() - self._started
+    if self.total:
+      eta = elapsed / self.count * (self.total - self.count)
+      line = '[{}/{}] {} (elapsed {}, ETA {})'.format(self.count, self.total, label,
+        _format_duration(elapsed), _format_duration(eta))
+    else:
+      line = '[{}] {} (elapsed {})'.format(self.count, label, _format_duration(elapsed))
+    print(line, file=self.out)
@@ -0,0 +1,127 @@
+# -*- coding: utf8 -*-
+# Copyright (c) 2020 Niklas Rosenstein
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+
+"""
+Captures the size, ETag and content hash of the images of a #WallpaperSpec, which allows
+downloaders to skip, resume and verify downloads without fetching the image again.
+"""
+
+from aiad_cli.core import ImageWithResolution, WallpaperSpec
+from aiad_cli.utils import get_user_agent
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+import hashlib
+import logging
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+def has_metadata(image: ImageWithResolution, hash: bool = False) -> bool:
+  """
+  Returns #True if the *image* has the metadata that would be captured by
+  #fetch_image_metadata() with the same *hash* argument. The ETag is not required because
+  not all servers send one.
+  """
+
+  if hash:
+    return image.size is not None and image.sha256 is not None
+  return image.size is not None
+
+
+def update_from_headers(image: ImageWithResolution, headers: Dict[str, str]) -> None:
+  """
+  Updates the #ImageWithResolution.size and #ImageWithResolution.etag from the HTTP response
+  *headers* of the image URL. Resolvers that already send a request to the image can use this
+  to capture the metadata for free.
+  """
+
+  if 'Content-Length' in headers:
+    image.size = int(headers['Content-Length'])
+  if 'ETag' in headers:
+    image.etag = headers['ETag']
+
+
+def fetch_image_metadata(
+  image: ImageWithResolution,
+  hash: bool = False,
+  session: Optional[requests.Session] = None,
+) -> None:
+  """
+  Captures the metadata of *image* with a HEAD request. If *hash* is enabled, the image is
+  downloaded instead to compute its SHA-256 hash and exact size.
+  """
+
+  session = session or requests.Session()
+  headers = {'User-Agent': get_user_agent()}
+  if not hash:
+    response = session.head(image.image_url, headers=headers, allow_redirects=True)
+    response.raise_for_status()
+    update_from_headers(image, response.headers)
+    return
+
+  with session.get(image.image_url, headers=headers, stream=True) as response:
+    response.raise_for_status()
+    hasher = hashlib.sha256()
+    size = 0
+    for chunk in response.iter_content(64 * 1024):
+      hasher.update(chunk)
+      size += len(chunk)
+    update_from_headers(image, response.headers)
+    image.size = size
+    image.sha256 = hasher.hexdigest()
+
+
+def fetch_spec_metadata(
+  spec: WallpaperSpec,
+  hash: bool = False,
+  force: bool = False,
+  jobs: Optional[int] = None,
+) -> int:
+  """
+  Captures the metadata of all images in *spec* concurrently, including the images in
+  #WallpaperSpec.resolution_aliases. Every URL is requested only once. Images that already
+  have the metadata are skipped unless *force* is enabled. Returns the number of requests.
+  """
+
+  by_url = {}  # type: Dict[str, List[ImageWithResolution]]
+  for image in list(spec.resolutions) + list(spec.resolution_aliases.values()):
+    by_url.setdefault(image.image_url, []).append(image)
+
+  pending = [images for images in by_url.values()
+    if force or not all(has_metadata(x, hash) for x in images)]
+  if not pending:
+    return 0
+
+  session = requests.Session()
+
+  def _fetch(images: List[ImageWithResolution]) -> None:
+    logger.info('Fetching metadata for %s', images[0].image_url)
+    fetch_image_metadata(images[0], hash, session)
+    for image in images[1:]:
+      image.size, image.etag, image.sha256 = images[0].size, images[0].etag, images[0].sha256
+
+  with ThreadPoolExecutor(jobs) as executor:
+    for future in [executor.submit(_fetch, images) for images in pending]:
+      future.result()
+
+  return len(pending)
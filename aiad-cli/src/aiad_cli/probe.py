@@ -0,0 +1,207 @@
+# -*- coding: utf8 -*-
+# Copyright (c) 2020 Niklas Rosenstein
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+
+"""
+Determines the true dimensions of images by downloading only the first few kilobytes with an
+HTTP Range request and parsing the JPEG, PNG or WebP header. For JPEGs, the dimensions are
+swapped if the Exif orientation rotates the image by 90 degrees.
+"""
+
+from aiad_cli.core import ImageWithResolution, WallpaperSpec
+from aiad_cli.utils import get_user_agent
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import logging
+import re
+import requests
+import struct
+
+logger = logging.getLogger(__name__)
+
+#: JPEG start of frame markers that carry the image dimensions. Excludes DHT (C4), JPG (C8)
+#: and DAC (CC), which share the same range.
+_JPEG_SOF_MARKERS = frozenset([0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB,
+  0xCD, 0xCE, 0xCF])
+
+
+class UnsupportedImageError(ValueError):
+  pass
+
+
+def _parse_exif_orientation(data: bytes) -> Optional[int]:
+  """
+  Returns the Orientation tag from the IFD0 of an APP1 Exif payload, if present.
+  """
+
+  if data[:6] != b'Exif\x00\x00' or len(data) < 14:
+    return None
+  tiff = data[6:]
+  order = {b'II': '<', b'MM': '>'}.get(tiff[:2])
+  if not order:
+    return None
+  offset = struct.unpack(order + 'I', tiff[4:8])[0]
+  if offset + 2 > len(tiff):
+    return None
+  count = struct.unpack(order + 'H', tiff[offset:offset + 2])[0]
+  for index in range(offset + 2, min(offset + 2 + count * 12, len(tiff) - 11), 12):
+    tag = struct.unpack(order + 'H', tiff[index:index + 2])[0]
+    if tag == 0x0112:
+      return struct.unpack(order + 'H', tiff[index + 8:index + 10])[0]
+  return None
+
+
+def _parse_jpeg(data: bytes) -> Optional[Tuple[int, int]]:
+  orientation = None
+  index = 2
+  while index + 4 <= len(data):
+    if data[index] != 0xFF:
+      raise UnsupportedImageError('invalid JPEG marker at offset {}'.format(index))
+    marker = data[index + 1]
+    if marker == 0xFF:
+      # Fill byte.
+      index += 1
+      continue
+    if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+      # Markers without a payload.
+      index += 2
+      continue
+    if marker in _JPEG_SOF_MARKERS:
+      if index + 9 > len(data):
+        return None
+      height, width = struct.unpack('>HH', data[index + 5:index + 9])
+      # Orientations 5 to 8 rotate the image by 90 degrees when it is displayed.
+      if orientation is not None and 5 <= orientation <= 8:
+        width, height = height, width
+      return width, height
+    length = struct.unpack('>H', data[index + 2:index + 4])[0]
+    if marker == 0xE1 and orientation is None:
+      if index + 2 + length > len(data):
+        return None
+      orientation = _parse_exif_orientation(data[index + 4:index + 2 + length])
+    index += 2 + length
+  return None
+
+
+def _parse_webp(data: bytes) -> Optional[Tuple[int, int]]:
+  if len(data) < 30:
+    return None
+  chunk = data[12:16]
+  if chunk == b'VP8 ':
+    if data[23:26] != b'\x9d\x01\x2a':
+      raise UnsupportedImageError('invalid VP8 frame header')
+    width, height = struct.unpack('<HH', data[26:30])
+    return width & 0x3FFF, height & 0x3FFF
+  if chunk == b'VP8L':
+    bits = struct.unpack('<I', data[21:25])[0]
+    return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+  if chunk == b'VP8X':
+    width = int.from_bytes(data[24:27], 'little') + 1
+    height = int.from_bytes(data[27:30], 'little') + 1
+    return width, height
+  raise UnsupportedImageError('unsupported WebP chunk: {!r}'.format(chunk))
+
+
+def parse_image_size(data: bytes) -> Optional[Tuple[int, int]]:
+  """
+  Parses the (width, height) of a JPEG, PNG or WebP image from the beginning of its content.
+  Returns #None if *data* is too short to contain the dimensions. Raises an
+  #UnsupportedImageError if the format is not recognized.
+  """
+
+  if data[:2] == b'\xff\xd8':
+    return _parse_jpeg(data)
+  if data[:8] == b'\x89PNG\r\n\x1a\n':
+    if len(data) < 24:
+      return None
+    return struct.unpack('>II', data[16:24])
+  if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+    return _parse_webp(data)
+  if len(data) < 12:
+    return None
+  raise UnsupportedImageError('unsupported image format')
+
+
+def probe_image_size(
+  url: str,
+  session: Optional[requests.Session] = None,
+  max_bytes: int = 256 * 1024,
+) -> Tuple[int, int]:
+  """
+  Returns the (width, height) of the image at *url*. Only the first bytes of the image are
+  requested. JPEGs with large metadata blocks may need more data, so the response is read in
+  small chunks until the dimensions are found or *max_bytes* have been read.
+  """
+
+  session = session or requests.Session()
+  headers = {'User-Agent': get_user_agent(), 'Range': 'bytes=0-{}'.format(max_bytes - 1)}
+  with session.get(url, headers=headers, stream=True) as response:
+    response.raise_for_status()
+    data = b''
+    for chunk in response.iter_content(4096):
+      data += chunk
+      size = parse_image_size(data)
+      if size:
+        return size
+      if len(data) >= max_bytes:
+        break
+  raise UnsupportedImageError('image dimensions not found in the first {} bytes of {}'
+    .format(len(data), url))
+
+
+def probe_spec(spec: WallpaperSpec, jobs: Optional[int] = None) -> int:
+  """
+  Probes the true dimensions of all images in *spec* concurrently and updates their width and
+  height, as well as the dimensions in their filenames. Every URL is requested only once.
+  Call #WallpaperSpec.normalize() afterwards. Returns the number of images that changed.
+  """
+
+  by_url = {}  # type: Dict[str, List[ImageWithResolution]]
+  for image in list(spec.resolutions) + list(spec.resolution_aliases.values()):
+    by_url.setdefault(image.image_url, []).append(image)
+
+  session = requests.Session()
+
+  def _probe(url: str) -> Optional[Tuple[int, int]]:
+    try:
+      return probe_image_size(url, session)
+    except (requests.RequestException, UnsupportedImageError) as exc:
+      logger.warning('Could not probe %s, keeping the inferred dimensions: %s', url, exc)
+      return None
+
+  with ThreadPoolExecutor(jobs) as executor:
+    sizes = dict(zip(by_url, executor.map(_probe, by_url)))
+
+  changed = 0
+  for url, size in sizes.items():
+    if size is None:
+      continue
+    width, height = size
+    for image in by_url[url]:
+      if (image.width, image.height) == (width, height):
+        continue
+      logger.info('Probed %dx%d instead of %dx%d for %s', width, height, image.width,
+        image.height, url)
+      image.filename = re.sub(r'-{}-{}(\.[^.]+)$'.format(image.width, image.height),
+        r'-{}-{}\1'.format(width, height), image.filename)
+      image.width, image.height = width, height
+      changed += 1
+  return changed
@@ -19,7 +19,8 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
 # IN THE SOFTWARE.
 
-from aiad_cli.core import WallpaperSpec
+from aiad_cli.core import IWallpaperListResolver, WallpaperSpec
+from typing import Iterable, Optional
 import pkg_resources
 
 ENTRYPOINT_NAME = __name__
@@ -35,3 +36,11 @@ def resolve_url(url: str) -> WallpaperSpec:
     if resolver.match_url(url):
       return resolver.resolve(url)
   raise UnresolvableUrlError(url)
+
+
+def resolve_list_url(url: str, limit: Optional[int] = None) -> Iterable[WallpaperSpec]:
+  for entry_point in pkg_resources.iter_entry_points(ENTRYPOINT_NAME):
+    resolver = entry_point.load()()
+    if IWallpaperListResolver.provided_by(resolver) and resolver.match_list_url(url):
+      return resolver.resolve_list(url, limit)
+  raise UnresolvableUrlError(url)
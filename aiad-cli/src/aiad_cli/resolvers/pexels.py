@@ -19,36 +19,37 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
 # IN THE SOFTWARE.
 
-from aiad_cli.core import ImageCredit, ImageWithResolution, IWallpaperSpecResolver, WallpaperSpec
+from aiad_cli.core import ImageCredit, ImageWithResolution, IWallpaperListResolver, \
+  IWallpaperSpecResolver, WallpaperSpec
 from aiad_cli.utils import get_user_agent
 from nr.interface import implements, override
+from typing import Any, Dict, Iterable, List, Optional
 import os
 import re
 import requests
 import urllib.parse
 
 
-@implements(IWallpaperSpecResolver)
+@implements(IWallpaperSpecResolver, IWallpaperListResolver)
 class PexelsWallpaperSpecResolver:
 
   _regex = re.compile(r'^https://(?:www\.)?pexels.com/photo/([^/]+)-(\d+)/?$')
+  _collection_regex = re.compile(r'^https://(?:www\.)?pexels.com/collections/(?:[^/]+-)?(\w+)/?$')
+  _search_regex = re.compile(r'^https://(?:www\.)?pexels.com/search/([^/?]+)/?$')
 
-  @override
-  def match_url(self, url: str) -> bool:
-    return self._regex.match(url)
+  #: The maximum page size supported by the Pexels API.
+  _per_page = 80
 
-  @override
-  def resolve(self, url: str) -> WallpaperSpec:
+  def _get(self, url: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
     api_token = os.getenv('PEXELS_TOKEN')
     if not api_token:
       raise EnvironmentError('PEXELS_TOKEN is not set.')
-
-    name, photo_id = self._regex.match(url).groups()
-    response = requests.get('https://api.pexels.com/v1/photos/' + photo_id,
+    response = requests.get(url, params=params,
       headers={'Authorization': api_token, 'User-Agent': get_user_agent()})
     response.raise_for_status()
-    data = response.json()
+    return response.json()
 
+  def _spec_from_photo(self, data: Dict[str, Any], name: str, keywords: List[str]) -> WallpaperSpec:
     def _with_filename(height: int, width: int, url: str) -> ImageWithResolution:
       suffix = urllib.parse.urlsplit(url).path.rpartition('.')[2]
       filename = '{}-{}-{}.{}'.format(name, width, height, suffix)
@@ -71,7 +72,7 @@ class PexelsWallpaperSpecResolver:
 
     return WallpaperSpec(
       name=name,
-      keywords=[],
+      keywords=keywords,
       source_url=data['url'],
       credit=ImageCredit(
         text='This Photo was taken by {} on Pexels.'.format(data['photographer']),
@@ -80,3 +81,49 @@ class PexelsWallpaperSpecResolver:
       ),
       resolutions=resolutions,
     )
+
+  @override
+  def match_url(self, url: str) -> bool:
+    return self._regex.match(url)
+
+  @override
+  def resolve(self, url: str) -> WallpaperSpec:
+    name, photo_id = self._regex.match(url).groups()
+    data = self._get('https://api.pexels.com/v1/photos/' + photo_id)
+    return self._spec_from_photo(data, name, [])
+
+  @override
+  def match_list_url(self, url: str) -> bool:
+    return self._collection_regex.match(url) or self._search_regex.match(url)
+
+  @override
+  def resolve_list(self, url: str, limit: Optional[int] = None) -> Iterable[WallpaperSpec]:
+    # The Pexels API has no tags, but the search terms make good keywords.
+    match = self._search_regex.match(url)
+    if match:
+      query = urllib.parse.unquote_plus(match.group(1)).replace('-', ' ')
+      api_url, key = 'https://api.pexels.com/v1/search', 'photos'
+      params = {'query': query}
+      keywords = query.lower().split()
+    else:
+      collection_id = self._collection_regex.match(url).group(1)
+      api_url, key = 'https://api.pexels.com/v1/collections/' + collection_id, 'media'
+      params = {'type': 'photos'}
+      keywords = []
+
+    count = 0
+    page = 1
+    while True:
+      data = self._get(api_url, dict(params, page=page, per_page=self._per_page))
+      for photo in data[key]:
+        if photo.get('type', 'Photo') != 'Photo':
+          continue
+        match = self._regex.match(photo['url'])
+        name = match.group(1) if match else 'pexels-{}'.format(photo['id'])
+        yield self._spec_from_photo(photo, name, list(keywords))
+        count += 1
+        if limit is not None and count >= limit:
+          return
+      if not data.get('next_page') or not data[key]:
+        return
+      page += 1
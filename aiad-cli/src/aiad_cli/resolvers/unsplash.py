@@ -19,46 +19,59 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
 # IN THE SOFTWARE.
 
-from aiad_cli.core import ImageCredit, ImageWithResolution, IWallpaperSpecResolver, WallpaperSpec
+from aiad_cli.core import ImageCredit, ImageWithResolution, IWallpaperListResolver, \
+  IWallpaperSpecResolver, WallpaperSpec
+from aiad_cli.metadata import update_from_headers
 from aiad_cli.utils import get_user_agent
 from nr.interface import implements, override
+from typing import Any, Dict, Iterable, List, Optional
 import os
 import re
 import requests
 import urllib.parse
 
 
-@implements(IWallpaperSpecResolver)
+@implements(IWallpaperSpecResolver, IWallpaperListResolver)
 class UnsplashWallpaperSpecResolver:
 
   _regex = re.compile(r'^https://(?:www\.)?unsplash.com/photos/([^/]+)/?$')
+  _collection_regex = re.compile(r'^https://(?:www\.)?unsplash.com/collections/(\w+)(?:/[^/]*)?/?$')
+  _search_regex = re.compile(r'^https://(?:www\.)?unsplash.com/s/photos/([^/?]+)/?$')
+  _user_regex = re.compile(r'^https://(?:www\.)?unsplash.com/@([^/?]+)/?$')
   _bad_keywords = set(['android', 'wallpaper', 'ios', 'iphone'])
 
-  @override
-  def match_url(self, url: str) -> bool:
-    return self._regex.match(url)
+  #: The maximum page size supported by the Unsplash API.
+  _per_page = 30
 
-  @override
-  def resolve(self, url: str) -> WallpaperSpec:
+  def _get(self, url: str, params: Dict[str, Any] = None) -> Any:
     access_key = os.getenv('UNSPLASH_ACCESS_KEY')
     if not access_key:
       raise EnvironmentError('UNSPLASH_ACCESS_KEY is not set.')
-
-    photo_id = self._regex.match(url).group(1)
-    response = requests.get('https://api.unsplash.com/photos/' + photo_id,
+    response = requests.get(url, params=params,
       headers={'Authorization': 'Client-ID ' + access_key, 'User-Agent': get_user_agent()})
     response.raise_for_status()
-    data = response.json()
-    name = data['alt_description'] or data['description']
+    return response.json()
+
+  def _spec_from_photo(self, data: Dict[str, Any], head: bool = True) -> WallpaperSpec:
+    name = data['alt_description'] or data['description'] or 'unsplash-' + data['id']
 
     def _with_filename(height: int, width: int, url: str) -> ImageWithResolution:
-      headers = requests.head(url, headers={'User-Agent': get_user_agent()}).headers
-      content_type = headers['Content-Type']
-      if not content_type.startswith('image/'):
-        raise RuntimeError('unexpected non-image content-type: {!r}'.format(content_type))
-      suffix = content_type.lstrip('image/')
+      if head:
+        headers = requests.head(url, headers={'User-Agent': get_user_agent()}).headers
+        content_type = headers['Content-Type']
+        if not content_type.startswith('image/'):
+          raise RuntimeError('unexpected non-image content-type: {!r}'.format(content_type))
+        suffix = content_type.lstrip('image/')
+      else:
+        # Take the format from the imgix "fm" parameter instead of sending a HEAD request.
+        query_params = urllib.parse.parse_qs(urllib.parse.urlsplit(url).query)
+        suffix = query_params.get('fm', ['jpeg'])[0]
+        suffix = {'jpg': 'jpeg'}.get(suffix, suffix)
+        headers = {}
       filename = '{}-{}-{}.{}'.format(re.sub(r'[\s,\.]+', '-', name), width, height, suffix)
-      return ImageWithResolution(height, width, url, filename)
+      image = ImageWithResolution(height, width, url, filename)
+      update_from_headers(image, headers)
+      return image
 
     resolutions = []
     #resolutions.append(_with_filename(data['height'], data['width'], data['urls']['raw']))
@@ -71,12 +84,13 @@ class UnsplashWallpaperSpecResolver:
       height = int(round(width / data['width'] * data['height']))
       resolutions.append(_with_filename(height, width, url))
 
-    tags = (x['title'] for x in data['tags'] if x['type'] == 'search')
+    # Tags are only included in the response of the single photo endpoint.
+    tags = (x['title'] for x in data.get('tags', []) if x['type'] == 'search')
     tags = (x.strip('#') for x in tags if not any(y in x for y in self._bad_keywords))
 
     return WallpaperSpec(
       name=name,
-      keywords=tags,
+      keywords=list(tags),
       source_url=data['links']['html'],
       credit=ImageCredit(
         text='This Photo was taken by {} on Unsplash.'.format(data['user']['name']),
@@ -85,3 +99,49 @@ class UnsplashWallpaperSpecResolver:
       ),
       resolutions=resolutions,
     )
+
+  @override
+  def match_url(self, url: str) -> bool:
+    return self._regex.match(url)
+
+  @override
+  def resolve(self, url: str) -> WallpaperSpec:
+    photo_id = self._regex.match(url).group(1)
+    return self._spec_from_photo(self._get('https://api.unsplash.com/photos/' + photo_id))
+
+  @override
+  def match_list_url(self, url: str) -> bool:
+    return any(x.match(url) for x in (self._collection_regex, self._search_regex, self._user_regex))
+
+  @override
+  def resolve_list(self, url: str, limit: Optional[int] = None) -> Iterable[WallpaperSpec]:
+    keywords = []  # type: List[str]
+    match = self._search_regex.match(url)
+    if match:
+      query = urllib.parse.unquote_plus(match.group(1)).replace('-', ' ')
+      api_url, params = 'https://api.unsplash.com/search/photos', {'query': query}
+      keywords = query.lower().split()
+    elif self._user_regex.match(url):
+      username = self._user_regex.match(url).group(1)
+      api_url, params = 'https://api.unsplash.com/users/{}/photos'.format(username), {}
+    else:
+      collection_id = self._collection_regex.match(url).group(1)
+      api_url, params = 'https://api.unsplash.com/collections/{}/photos'.format(collection_id), {}
+
+    count = 0
+    page = 1
+    while True:
+      data = self._get(api_url, dict(params, page=page, per_page=self._per_page))
+      # The search endpoint wraps the photos in an object, the others return a plain list.
+      photos = data['results'] if isinstance(data, dict) else data
+      for photo in photos:
+        spec = self._spec_from_photo(photo, head=False)
+        if not spec.keywords:
+          spec.keywords = list(keywords)
+        yield spec
+        count += 1
+        if limit is not None and count >= limit:
+          return
+      if len(photos) < self._per_page:
+        return
+      page += 1
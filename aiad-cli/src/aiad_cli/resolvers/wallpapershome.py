@@ -20,6 +20,7 @@
 # IN THE SOFTWARE.
 
 from aiad_cli.core import ImageCredit, ImageWithResolution, IWallpaperSpecResolver, WallpaperSpec
+from aiad_cli.metadata import update_from_headers
 from aiad_cli.utils import get_user_agent
 from nr.interface import implements, override
 import bs4
@@ -66,8 +67,9 @@ class WallpapersHomeSpecResolver:
         logger.warning('Download link for resolution %s is broken (%s).', name, response.status_code)
         continue
 
-      resolutions.append(ImageWithResolution(
-        int(height), int(width), image_url, posixpath.basename(image_url)))
+      image = ImageWithResolution(int(height), int(width), image_url, posixpath.basename(image_url))
+      update_from_headers(image, response.headers)
+      resolutions.append(image)
 
     if not resolutions:
       raise ValueError('all download links are broken')
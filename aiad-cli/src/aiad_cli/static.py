@@ -0,0 +1,286 @@
+# -*- coding: utf8 -*-
+# Copyright (c) 2020 Niklas Rosenstein
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+
+"""
+Renders a channel of the Wallpapers database into a static tree of JSON files that can be
+served by any plain file server:
+
+    <channel>/
+      latest.json               The most recent date, including its spec.
+      dates.json                A sorted list of all dates in the channel.
+      etags.json                Maps every file path to the ETag of its content.
+      <yyyy>/index.json         The months of the year.
+      <yyyy>/<mm>/index.json    The days of the month, with their names.
+      <yyyy>/<mm>/<dd>.json     The spec for that day.
+
+Every file is accompanied by a gzip (`.gz`) and, if the `brotli` module is installed, a
+brotli (`.br`) compressed version. Builds are incremental: only the outputs affected by
+changed spec files are rendered and compressed again.
+"""
+
+from aiad_cli.core import WallpaperSpec
+from aiad_cli.database import WallpapersDatabase
+from aiad_cli.utils import atomic_write
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
+import datetime
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+
+try:
+  import brotli
+except ImportError:
+  brotli = None
+
+STATE_FILENAME = '.static-state.json'
+
+logger = logging.getLogger(__name__)
+
+
+def get_etag(data: bytes) -> str:
+  return hashlib.sha256(data).hexdigest()[:20]
+
+
+_brotli_warned = False
+
+
+def _warn_missing_brotli() -> None:
+  global _brotli_warned
+  if brotli is None and not _brotli_warned:
+    logger.warning('The brotli module is not installed, no .br files will be written.')
+    _brotli_warned = True
+
+
+def _gzip(data: bytes) -> bytes:
+  # gzip.compress() only accepts an mtime since Python 3.8.
+  out = io.BytesIO()
+  with gzip.GzipFile(fileobj=out, mode='wb', compresslevel=9, mtime=0) as fp:
+    fp.write(data)
+  return out.getvalue()
+
+
+def _parse_date(key: str) -> datetime.date:
+  return datetime.date(*map(int, key.split('-')))
+
+
+def _dumps(data: Any) -> bytes:
+  return json.dumps(data, separators=(',', ':'), sort_keys=True).encode('utf8')
+
+
+class StaticBuilder:
+  """
+  Builds the static tree for channels of the Wallpapers database in *wallpapers_dir* into
+  *output_dir*. The hashes of the input specs and the ETags of all outputs are stored in a
+  state file in the output directory to determine what needs to be rebuilt.
+  """
+
+  def __init__(self, wallpapers_dir: str, output_dir: str, jobs: Optional[int] = None) -> None:
+    self.wallpapers_dir = wallpapers_dir
+    self.output_dir = output_dir
+    self.jobs = jobs
+    _warn_missing_brotli()
+    self._state_filename = os.path.join(output_dir, STATE_FILENAME)
+    try:
+      with open(self._state_filename) as fp:
+        self._state = json.load(fp)
+    except FileNotFoundError:
+      self._state = {}
+
+  def _write(self, path: str, data: bytes) -> None:
+    filename = os.path.join(self.output_dir, path)
+    with atomic_write(filename, 'wb') as fp:
+      fp.write(data)
+    with atomic_write(filename + '.gz', 'wb') as fp:
+      fp.write(_gzip(data))
+    if brotli is not None:
+      with atomic_write(filename + '.br', 'wb') as fp:
+        fp.write(brotli.compress(data))
+
+  def _remove(self, path: str) -> None:
+    filename = os.path.join(self.output_dir, path)
+    for suffix in ('', '.gz', '.br'):
+      try:
+        os.remove(filename + suffix)
+      except FileNotFoundError:
+        pass
+
+  def build(self, channel: str, changed: Optional[Set[datetime.date]] = None) -> List[str]:
+    """
+    Brings the static tree for *channel* up to date and returns the paths of the outputs
+    that were written. Every spec file is hashed to detect changes, unless the *changed*
+    dates are known (e.g. from `git diff`), in which case only the specs of these dates are
+    read and all other dates are taken from the previous build.
+    """
+
+    db = WallpapersDatabase(os.path.join(self.wallpapers_dir, channel))
+    state = self._state.get(channel, {'specs': {}, 'outputs': {}})
+    old_specs = state['specs']  # type: Dict[str, List[str]]
+    old_outputs = state['outputs']  # type: Dict[str, str]
+
+    outputs = {}  # type: Dict[str, bytes]
+    dirty_months = set()  # type: Set[Tuple[int, int]]
+
+    if changed is not None and old_specs:
+      # Start from the previous state and only list the months of the changed dates, so that
+      # the work scales with the size of the change rather than with the channel.
+      specs = {k: v for k, v in old_specs.items() if _parse_date(k) not in changed}
+      files = ((date, filename)
+        for year, month in sorted(set((x.year, x.month) for x in changed))
+        for date, filename in db.files(year, month) if date in changed)
+    else:
+      specs = {}
+      files = ((date, filename)
+        for year in db.years() for month in db.months(year)
+        for date, filename in db.files(year, month))
+
+    for date, filename in files:
+      key = date.isoformat()
+      source = os.path.relpath(filename, db.directory).replace(os.sep, '/')
+      old = old_specs.get(key)
+      with open(filename, 'rb') as fp:
+        content = fp.read()
+      digest = hashlib.sha256(content).hexdigest()
+      if old and old[:2] == [source, digest] and self._exists(channel, date):
+        specs[key] = old
+        continue
+      spec = WallpaperSpec.from_json(json.loads(content.decode('utf8')), filename)
+      data = _dumps(spec.to_json(None))
+      outputs[self._spec_path(date)] = data
+      specs[key] = [source, digest, spec.name or '', get_etag(data)]
+      dirty_months.add((date.year, date.month))
+
+    removed = set(old_specs) - set(specs)
+    for key in removed:
+      date = _parse_date(key)
+      dirty_months.add((date.year, date.month))
+
+    by_month = {}  # type: Dict[Tuple[int, int], List[str]]
+    for key in sorted(specs):
+      by_month.setdefault((int(key[:4]), int(key[5:7])), []).append(key)
+
+    # Restore the manifests if any of the outputs were deleted from the tree. This is only
+    # checked on full builds, as it needs to stat every output.
+    output_dir = os.path.join(self.output_dir, channel)
+    if changed is None and not all(os.path.isfile(os.path.join(output_dir, x)) for x in old_outputs):
+      dirty_months.update(by_month)
+    elif not dirty_months and old_outputs:
+      return []
+
+    for year, month in sorted(dirty_months):
+      keys = by_month.get((year, month))
+      if keys:
+        outputs['{:0>4}/{:0>2}/index.json'.format(year, month)] = _dumps({
+          'year': year,
+          'month': month,
+          'days': [{
+            'date': key,
+            'name': specs[key][2],
+            'url': '{}.json'.format(key[8:]),
+            'etag': specs[key][3],
+          } for key in keys],
+        })
+
+    month_etags = dict(old_outputs)
+    for path, data in outputs.items():
+      month_etags[path] = get_etag(data)
+    for year in sorted(set(year for year, month in dirty_months)):
+      months = sorted(month for (y, month) in by_month if y == year)
+      if months:
+        outputs['{:0>4}/index.json'.format(year)] = _dumps({
+          'year': year,
+          'months': [{
+            'month': month,
+            'days': len(by_month[(year, month)]),
+            'url': '{:0>2}/index.json'.format(month),
+            'etag': month_etags['{:0>4}/{:0>2}/index.json'.format(year, month)],
+          } for month in months],
+        })
+
+    if specs:
+      latest_key = max(specs)
+      latest_date = _parse_date(latest_key)
+      with open(os.path.join(db.directory, specs[latest_key][0]), 'rb') as fp:
+        latest_spec = json.loads(fp.read().decode('utf8'))
+      outputs['dates.json'] = _dumps(sorted(specs))
+      outputs['latest.json'] = _dumps({
+        'date': latest_key,
+        'url': self._spec_path(latest_date),
+        'etag': specs[latest_key][3],
+        'spec': WallpaperSpec.from_json(latest_spec).to_json(None),
+      })
+
+    # Compute the full set of outputs, dropping the files of removed dates and months.
+    new_outputs = dict(old_outputs)
+    for key in removed:
+      date = _parse_date(key)
+      new_outputs.pop(self._spec_path(date), None)
+    for year, month in dirty_months:
+      if (year, month) not in by_month:
+        new_outputs.pop('{:0>4}/{:0>2}/index.json'.format(year, month), None)
+      if not any(y == year for y, m in by_month):
+        new_outputs.pop('{:0>4}/index.json'.format(year), None)
+    if not specs:
+      new_outputs.pop('dates.json', None)
+      new_outputs.pop('latest.json', None)
+
+    to_write = []
+    for path, data in sorted(outputs.items()):
+      etag = get_etag(data)
+      new_outputs[path] = etag
+      full_path = os.path.join(channel, path)
+      if old_outputs.get(path) != etag or not os.path.isfile(os.path.join(self.output_dir, full_path)):
+        to_write.append((full_path, data))
+
+    new_outputs.pop('etags.json', None)
+    etags = _dumps(new_outputs)
+    new_outputs['etags.json'] = get_etag(etags)
+    etags_path = os.path.join(channel, 'etags.json')
+    if old_outputs.get('etags.json') != new_outputs['etags.json'] or \
+        not os.path.isfile(os.path.join(self.output_dir, etags_path)):
+      to_write.append((etags_path, etags))
+    to_remove = set(old_outputs) - set(new_outputs)
+
+    # Compression happens in the zlib and brotli C code which releases the GIL, so threads
+    # are enough to parallelise it.
+    with ThreadPoolExecutor(self.jobs) as executor:
+      for future in [executor.submit(self._write, path, data) for path, data in to_write]:
+        future.result()
+    for path in to_remove:
+      self._remove(os.path.join(channel, path))
+
+    self._state[channel] = {'specs': specs, 'outputs': new_outputs}
+    with atomic_write(self._state_filename) as fp:
+      json.dump(self._state, fp)
+
+    logger.info('Wrote %d and removed %d file(s) for channel %r.', len(to_write),
+      len(to_remove), channel)
+    return [path for path, data in to_write]
+
+  def _spec_path(self, date: datetime.date) -> str:
+    return '{:0>4}/{:0>2}/{:0>2}.json'.format(date.year, date.month, date.day)
+
+  def _exists(self, channel: str, date: datetime.date) -> bool:
+    return os.path.isfile(os.path.join(self.output_dir, channel, self._spec_path(date)))
@@ -0,0 +1,223 @@
+# -*- coding: utf8 -*-
+# Copyright (c) 2020 Niklas Rosenstein
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+
+"""
+Incremental synchronization of artefacts derived from the Wallpapers database. The last
+commit that was processed for a target is remembered in the output directory and the next
+sync only passes the spec files changed since that commit to the target.
+"""
+
+from aiad_cli.database import WallpapersDatabase
+from aiad_cli.utils import atomic_write
+from nr.interface import Interface
+from typing import Dict, Iterable, List, Optional
+import collections
+import datetime
+import json
+import logging
+import os
+import pkg_resources
+import re
+import subprocess
+
+ENTRYPOINT_NAME = __name__
+STATE_FILENAME = '.sync-state.json'
+
+logger = logging.getLogger(__name__)
+
+#: Represents a change to a spec file. The *status* is one of `A` (added), `M` (modified) or
+#: `D` (deleted). The *filename* is relative to the repository root.
+Change = collections.namedtuple('Change', 'status,channel,date,filename')
+
+
+class ISyncTarget(Interface):
+  """
+  An interface for artefacts that are derived from the Wallpapers database and can be updated
+  incrementally. Implementations are registered under the `aiad_cli.sync` entrypoint and are
+  constructed with the output directory as their only argument.
+  """
+
+  def rebuild(self, wallpapers_dir: str) -> None:
+    """
+    Rebuild the artefact from all specs in *wallpapers_dir*.
+    """
+
+  def update(self, wallpapers_dir: str, changes: List[Change]) -> None:
+    """
+    Apply the *changes* to the artefact. Deletions are always listed before additions,
+    so a spec that was renamed appears as a deletion followed by an addition.
+    """
+
+
+class GitError(Exception):
+  pass
+
+
+def _git(repo_dir: str, *args: str) -> str:
+  try:
+    return subprocess.check_output(['git'] + list(args), cwd=repo_dir,
+      stderr=subprocess.PIPE).decode('utf8')
+  except FileNotFoundError:
+    raise GitError('git is not installed')
+  except subprocess.CalledProcessError as exc:
+    raise GitError(exc.stderr.decode('utf8').strip())
+
+
+def get_head_commit(repo_dir: str) -> str:
+  return _git(repo_dir, 'rev-parse', 'HEAD').strip()
+
+
+def get_uncommitted_changes(repo_dir: str, path: str) -> List[str]:
+  """
+  Returns the `git status --porcelain` lines for uncommitted changes under *path*.
+  """
+
+  return _git(repo_dir, 'status', '--porcelain', '--', path).splitlines()
+
+
+def is_commit(repo_dir: str, rev: str) -> bool:
+  try:
+    _git(repo_dir, 'cat-file', '-e', rev + '^{commit}')
+    return True
+  except GitError:
+    return False
+
+
+def parse_spec_path(filename: str) -> Optional[Change]:
+  """
+  Parses a path of the form `Wallpapers/<channel>/<yyyy>/<mm>/<dd>[-<name>].json` relative
+  to the repository root. Returns a #Change with an empty status, or #None if the path does
+  not point to a spec file.
+  """
+
+  match = re.match(r'^Wallpapers/([^/]+)/(\d{4})/(\d{2})/(\d{2})(?:-[^/]*)?\.json$', filename)
+  if not match:
+    return None
+  try:
+    date = datetime.date(*map(int, match.groups()[1:]))
+  except ValueError:
+    return None
+  return Change('', match.group(1), date, filename)
+
+
+def get_changes(repo_dir: str, since: str, until: str) -> List[Change]:
+  """
+  Returns the changes to spec files between the commits *since* and *until*, with all
+  deletions ordered before the additions and modifications.
+  """
+
+  output = _git(repo_dir, 'diff', '--name-status', '--no-renames', '-z', since, until,
+    '--', 'Wallpapers/')
+  fields = output.split('\0')
+  changes = []
+  for status, filename in zip(fields[0::2], fields[1::2]):
+    change = parse_spec_path(filename)
+    if change and status in 'AMD':
+      changes.append(change._replace(status=status))
+  changes.sort(key=lambda x: x.status != 'D')
+  return changes
+
+
+def get_targets(output_dir: str, names: Iterable[str] = None) -> Dict[str, ISyncTarget]:
+  """
+  Loads the sync targets registered under the `aiad_cli.sync` entrypoint. If *names* is
+  specified, only those targets are loaded.
+  """
+
+  names = set(names) if names else None
+  targets = collections.OrderedDict()
+  for entry_point in pkg_resources.iter_entry_points(ENTRYPOINT_NAME):
+    if names is None or entry_point.name in names:
+      targets[entry_point.name] = entry_point.load()(output_dir)
+  if names:
+    missing = names - set(targets)
+    if missing:
+      raise ValueError('unknown sync targets: {}'.format(', '.join(sorted(missing))))
+  return targets
+
+
+def sync(
+  repo_dir: str,
+  output_dir: str,
+  targets: Dict[str, ISyncTarget],
+  full: bool = False,
+) -> Dict[str, Optional[List[Change]]]:
+  """
+  Brings all *targets* up to date with the HEAD commit of the repository in *repo_dir*.
+  Returns a dictionary that maps every target name to the changes that were applied to it,
+  or #None if the target was rebuilt from scratch.
+
+  Raises a #GitError if there are uncommitted changes in the `Wallpapers/` directory. Targets
+  read the specs from the working tree, but only changes between commits are ever reported to
+  them, so uncommitted edits that are reverted later would otherwise never be undone.
+  """
+
+  if get_uncommitted_changes(repo_dir, 'Wallpapers/'):
+    raise GitError('uncommitted changes in Wallpapers/, commit or stash them before syncing')
+
+  state_filename = os.path.join(output_dir, STATE_FILENAME)
+  try:
+    with open(state_filename) as fp:
+      state = json.load(fp)
+  except FileNotFoundError:
+    state = {}
+
+  head = get_head_commit(repo_dir)
+  wallpapers_dir = os.path.join(repo_dir, 'Wallpapers')
+  result = collections.OrderedDict()
+
+  for name, target in targets.items():
+    last = state.get(name)
+    if full or not last or not is_commit(repo_dir, last):
+      logger.info('Rebuilding sync target %r.', name)
+      target.rebuild(wallpapers_dir)
+      result[name] = None
+    else:
+      changes = get_changes(repo_dir, last, head) if last != head else []
+      logger.info('Applying %d change(s) to sync target %r.', len(changes), name)
+      if changes:
+        target.update(wallpapers_dir, changes)
+      result[name] = changes
+
+    # Record the progress after every target so that an interrupted sync does not have to
+    # redo the targets that are already up to date.
+    state[name] = head
+    with atomic_write(state_filename) as fp:
+      json.dump(state, fp, indent=2)
+
+  return result
+
+
+def list_specs(wallpapers_dir: str) -> Iterable[Change]:
+  """
+  Iterates over all spec files in *wallpapers_dir* as #Change objects with status `A`, for
+  targets that implement #ISyncTarget.rebuild() in terms of #ISyncTarget.update().
+  """
+
+  repo_dir = os.path.dirname(wallpapers_dir)
+  for channel in sorted(os.listdir(wallpapers_dir)):
+    if not os.path.isdir(os.path.join(wallpapers_dir, channel)):
+      continue
+    db = WallpapersDatabase(os.path.join(wallpapers_dir, channel))
+    for date in db.all():
+      filename = os.path.relpath(db.get_filename_for_day(date), repo_dir).replace(os.sep, '/')
+      yield Change('A', channel, date, filename)
@@ -0,0 +1,84 @@
+# -*- coding: utf8 -*-
+# Copyright (c) 2020 Niklas Rosenstein
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+
+from aiad_cli.sync import Change, ISyncTarget, list_specs
+from aiad_cli.utils import atomic_write
+from nr.interface import implements, override
+from typing import Dict, Iterable, List
+import collections
+import json
+import os
+
+
+@implements(ISyncTarget)
+class IndexSyncTarget:
+  """
+  Maintains a `<channel>/index.json` file in the output directory that maps every date to the
+  path of its spec file, relative to the channel directory.
+  """
+
+  def __init__(self, output_dir: str) -> None:
+    self.output_dir = output_dir
+
+  def _filename(self, channel: str) -> str:
+    return os.path.join(self.output_dir, channel, 'index.json')
+
+  def _load(self, channel: str) -> Dict[str, str]:
+    try:
+      with open(self._filename(channel)) as fp:
+        return json.load(fp)
+    except FileNotFoundError:
+      return {}
+
+  def _save(self, channel: str, index: Dict[str, str]) -> None:
+    with atomic_write(self._filename(channel)) as fp:
+      json.dump(index, fp, indent=2, sort_keys=True)
+
+  def _apply(self, changes: Iterable[Change], indexes: Dict[str, Dict[str, str]]) -> None:
+    for change in changes:
+      if change.channel not in indexes:
+        indexes[change.channel] = self._load(change.channel)
+      index = indexes[change.channel]
+      key = change.date.isoformat()
+      path = change.filename.split('/', 2)[2]
+      if change.status == 'D':
+        # Only remove the entry if it was not already replaced by a spec with another name.
+        if index.get(key) == path:
+          del index[key]
+      else:
+        index[key] = path
+
+  @override
+  def rebuild(self, wallpapers_dir: str) -> None:
+    indexes = collections.OrderedDict()
+    for change in list_specs(wallpapers_dir):
+      index = indexes.setdefault(change.channel, {})
+      index[change.date.isoformat()] = change.filename.split('/', 2)[2]
+    for channel, index in indexes.items():
+      self._save(channel, index)
+
+  @override
+  def update(self, wallpapers_dir: str, changes: List[Change]) -> None:
+    indexes = collections.OrderedDict()
+    self._apply(changes, indexes)
+    for channel, index in indexes.items():
+      self._save(channel, index)
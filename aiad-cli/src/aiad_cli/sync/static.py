@@ -0,0 +1,55 @@
+# -*- coding: utf8 -*-
+# Copyright (c) 2020 Niklas Rosenstein
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+
+from aiad_cli.static import StaticBuilder
+from aiad_cli.sync import Change, ISyncTarget
+from nr.interface import implements, override
+from typing import Dict, List, Set
+import datetime
+import os
+
+
+@implements(ISyncTarget)
+class StaticSyncTarget:
+  """
+  Keeps the static tree built by #StaticBuilder in the `static/` subdirectory of the output
+  directory up to date. Only the specs reported as changed are re-read.
+  """
+
+  def __init__(self, output_dir: str) -> None:
+    self.output_dir = os.path.join(output_dir, 'static')
+
+  @override
+  def rebuild(self, wallpapers_dir: str) -> None:
+    builder = StaticBuilder(wallpapers_dir, self.output_dir)
+    for channel in sorted(os.listdir(wallpapers_dir)):
+      if os.path.isdir(os.path.join(wallpapers_dir, channel)):
+        builder.build(channel)
+
+  @override
+  def update(self, wallpapers_dir: str, changes: List[Change]) -> None:
+    changed = {}  # type: Dict[str, Set[datetime.date]]
+    for change in changes:
+      changed.setdefault(change.channel, set()).add(change.date)
+    builder = StaticBuilder(wallpapers_dir, self.output_dir)
+    for channel, dates in sorted(changed.items()):
+      builder.build(channel, dates)
@@ -20,8 +20,44 @@
 # IN THE SOFTWARE.
 
 from aiad_cli import __version__
+import contextlib
+import os
 import requests
+import tempfile
+
+
+def _get_umask() -> int:
+  mask = os.umask(0)
+  os.umask(mask)
+  return mask
+
+
+#: The mode of regular files created under the current umask. Temporary files are created with
+#: mode 0600 and must be changed to this mode before they are renamed into place. The umask is
+#: read once because it can only be queried by changing it, which is not thread-safe.
+DEFAULT_FILE_MODE = 0o666 & ~_get_umask()
 
 
 def get_user_agent():
   return 'An-Image-a-Day/' + __version__
+
+
+@contextlib.contextmanager
+def atomic_write(filename: str, mode: str = 'w'):
+  """
+  Context manager that opens a temporary file next to *filename* for writing and renames it to
+  *filename* when the context exits without an exception.
+  """
+
+  directory = os.path.dirname(filename) or '.'
+  os.makedirs(directory, exist_ok=True)
+  fd, temp_filename = tempfile.mkstemp(prefix='.', suffix='.tmp', dir=directory)
+  try:
+    os.chmod(temp_filename, DEFAULT_FILE_MODE)
+    with os.fdopen(fd, mode) as fp:
+      yield fp
+    os.replace(temp_filename, filename)
+  except BaseException:
+    os.remove(temp_filename)
+    raise
+
@@ -0,0 +1,71 @@
+from aiad_cli.core import ImageCredit, ImageWithResolution, WallpaperSpec
+from aiad_cli.database import WallpapersDatabase
+import datetime
+import os
+import pytest
+
+DATE = datetime.date(2020, 1, 1)
+
+
+def make_spec(name):
+  image = ImageWithResolution(1080, 1920, 'https://example.org/{}.jpeg'.format(name), name + '.jpeg')
+  return WallpaperSpec(
+    name=name,
+    keywords=['test'],
+    source_url='https://example.org/' + name,
+    credit=ImageCredit('Test', 'Tester', 'https://example.org/tester'),
+    resolutions=[image],
+  )
+
+
+def list_month(db):
+  return sorted(os.listdir(os.path.join(db.directory, '2020', '01')))
+
+
+def test_save_replaces_file_with_different_name(tmpdir):
+  db = WallpapersDatabase(str(tmpdir))
+  db.save(DATE, make_spec('first'))
+  assert list_month(db) == ['01-first.json']
+
+  filename = db.save(DATE, make_spec('second'))
+  assert list_month(db) == ['01-second.json']
+  assert filename == db.get_filename_for_day(DATE)
+  assert db.load(DATE).name == 'second'
+
+
+def test_delete_then_save_in_one_transaction(tmpdir):
+  db = WallpapersDatabase(str(tmpdir))
+  db.save(DATE, make_spec('first'))
+
+  with db.transaction() as txn:
+    txn.delete(DATE)
+    txn.save(DATE, make_spec('second'))
+  assert list_month(db) == ['01-second.json']
+
+  with db.transaction() as txn:
+    txn.save(DATE, make_spec('third'))
+    txn.delete(DATE)
+  assert list_month(db) == []
+  assert not db.exists(DATE)
+
+
+def test_commit_failure_removes_temporary_files(tmpdir, monkeypatch):
+  db = WallpapersDatabase(str(tmpdir))
+  txn = db.transaction()
+  txn.save(DATE, make_spec('first'))
+  txn.save(DATE + datetime.timedelta(days=1), make_spec('second'))
+  assert len(list_month(db)) == 2
+
+  calls = []
+  replace = os.replace
+
+  def _failing_replace(src, dst):
+    if calls:
+      raise OSError('disk full')
+    calls.append(dst)
+    replace(src, dst)
+
+  monkeypatch.setattr(os, 'replace', _failing_replace)
+  with pytest.raises(OSError):
+    txn.commit()
+  assert list_month(db) == [os.path.basename(calls[0])]
@@ -0,0 +1,78 @@
+from aiad_cli.__main__ import cli, run_job
+from aiad_cli.database import WallpapersDatabase
+from aiad_cli.journal import JobJournal, JournalMismatchError
+from aiad_cli.resolvers.unsplash import UnsplashWallpaperSpecResolver
+from click.testing import CliRunner
+from test_database import make_spec
+import aiad_cli.__main__
+import datetime
+import os
+import pytest
+
+DATE = datetime.date(2020, 1, 1)
+
+
+def list_files(directory):
+  return sorted(os.path.relpath(os.path.join(root, name), directory)
+    for root, dirs, files in os.walk(directory) for name in files)
+
+
+def save_unit(unit, txn):
+  date = DATE + datetime.timedelta(days=int(unit))
+  return {'filename': txn.save(date, make_spec('spec-' + unit))}
+
+
+def test_run_job_commits_completed_units_on_iterator_error(tmpdir):
+  db = WallpapersDatabase(str(tmpdir.join('db')))
+  filename = str(tmpdir.join('job.jsonl'))
+
+  def _items():
+    for i in range(5):
+      yield str(i)
+    raise ConnectionError('connection reset by peer')
+
+  with pytest.raises(SystemExit) as excinfo:
+    run_job(JobJournal(filename, {'job': 1}), db, _items(), save_unit)
+  assert 'connection reset by peer' in str(excinfo.value)
+  assert len(list_files(db.directory)) == 5
+  assert all(not x.endswith('.tmp') for x in list_files(db.directory))
+
+  journal = JobJournal(filename, {'job': 1}, resume=True)
+  assert all(journal.is_done(str(i)) for i in range(5))
+  run_job(journal, db, iter(str(i) for i in range(7)), save_unit, total=7)
+  assert len(list_files(db.directory)) == 7
+  assert not os.path.exists(filename)
+
+
+def test_run_job_commit_failure_does_not_record_batch(tmpdir, monkeypatch):
+  db = WallpapersDatabase(str(tmpdir.join('db')))
+  filename = str(tmpdir.join('job.jsonl'))
+
+  def _replace(src, dst):
+    raise OSError('disk full')
+
+  monkeypatch.setattr(os, 'replace', _replace)
+  with pytest.raises(SystemExit):
+    run_job(JobJournal(filename, {'job': 1}), db, ['0', '1'], save_unit)
+  assert list_files(db.directory) == []
+  assert JobJournal(filename, {'job': 1}, resume=True).entries == {}
+
+
+@pytest.mark.parametrize('content', ['', '{"ke', '{"key": {"job": 2}}\n'])
+def test_journal_rejects_invalid_header(tmpdir, content):
+  filename = tmpdir.join('job.jsonl')
+  filename.write(content)
+  with pytest.raises(JournalMismatchError):
+    JobJournal(str(filename), {'job': 1}, resume=True)
+
+
+def test_import_reports_missing_credentials(tmpdir, monkeypatch):
+  monkeypatch.chdir(str(tmpdir))
+  monkeypatch.delenv('UNSPLASH_ACCESS_KEY', raising=False)
+  monkeypatch.setattr(aiad_cli.__main__, 'resolve_list_url',
+    lambda url, limit: UnsplashWallpaperSpecResolver().resolve_list(url, limit))
+  tmpdir.mkdir('Wallpapers')
+  result = CliRunner().invoke(cli, ['import', 'https://unsplash.com/collections/1065976'])
+  assert result.exit_code == 1
+  assert 'error: UNSPLASH_ACCESS_KEY is not set.' in result.output
+  assert not tmpdir.join('.aiad-jobs').check()
@@ -0,0 +1,48 @@
+from aiad_cli.core import ImageCredit, ImageWithResolution, WallpaperSpec
+from aiad_cli.probe import UnsupportedImageError, parse_image_size, probe_spec
+import os
+import pytest
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def read_fixture(name):
+  with open(os.path.join(FIXTURES, name), 'rb') as fp:
+    return fp.read()
+
+
+@pytest.mark.parametrize('name,size', [
+  ('baseline.jpeg', (12, 5)),
+  ('progressive.jpeg', (12, 5)),
+  ('rotated.jpeg', (5, 12)),
+  ('image.png', (12, 5)),
+  ('lossy.webp', (12, 5)),
+  ('lossless.webp', (12, 5)),
+  ('extended.webp', (12, 5)),
+])
+def test_parse_image_size(name, size):
+  assert parse_image_size(read_fixture(name)) == size
+
+
+@pytest.mark.parametrize('name', ['baseline.jpeg', 'rotated.jpeg', 'image.png', 'lossy.webp'])
+def test_parse_image_size_needs_more_data(name):
+  assert parse_image_size(read_fixture(name)[:20]) is None
+
+
+def test_parse_image_size_unsupported():
+  with pytest.raises(UnsupportedImageError):
+    parse_image_size(b'<!DOCTYPE html><html></html>')
+
+
+def test_probe_spec_keeps_inferred_dimensions_on_error():
+  # Nothing listens on the discard port, so the request fails immediately.
+  image = ImageWithResolution(1080, 1920, 'http://127.0.0.1:9/image.jpeg', 'image-1920-1080.jpeg')
+  spec = WallpaperSpec(
+    name='image',
+    keywords=['test'],
+    source_url='https://example.org/image',
+    credit=ImageCredit('Test', 'Tester', 'https://example.org/tester'),
+    resolutions=[image],
+  )
+  assert probe_spec(spec) == 0
+  assert (image.width, image.height, image.filename) == (1920, 1080, 'image-1920-1080.jpeg')
@@ -0,0 +1,180 @@
+from aiad_cli.resolvers.pexels import PexelsWallpaperSpecResolver
+from aiad_cli.resolvers.unsplash import UnsplashWallpaperSpecResolver
+import json
+import os
+import pytest
+import requests
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def load_fixture(name):
+  with open(os.path.join(FIXTURES, name)) as fp:
+    return json.load(fp)
+
+
+class FakeResponse:
+
+  def __init__(self, url, payload):
+    self.url = url
+    self.payload = payload
+
+  def raise_for_status(self):
+    if self.payload is None:
+      raise requests.HTTPError('404 Client Error: Not Found for url: ' + self.url)
+
+  def json(self):
+    return self.payload
+
+
+class FakeApi:
+  """
+  Replaces #requests.get() and serves the payloads registered for an URL and page number.
+  """
+
+  def __init__(self, monkeypatch):
+    self.pages = {}
+    self.calls = []
+    monkeypatch.setattr(requests, 'get', self.get)
+    monkeypatch.setattr(requests, 'head', self.head)
+
+  def add(self, url, page, payload):
+    self.pages[(url, page)] = payload
+
+  def get(self, url, params=None, headers=None):
+    self.calls.append((url, dict(params or {})))
+    return FakeResponse(url, self.pages.get((url, (params or {}).get('page'))))
+
+  def head(self, url, headers=None):
+    raise AssertionError('unexpected HEAD request: ' + url)
+
+
+@pytest.fixture
+def api(monkeypatch):
+  monkeypatch.setenv('UNSPLASH_ACCESS_KEY', 'test-key')
+  monkeypatch.setenv('PEXELS_TOKEN', 'test-token')
+  return FakeApi(monkeypatch)
+
+
+@pytest.mark.parametrize('url,expected', [
+  ('https://unsplash.com/collections/1065976/wallpapers', True),
+  ('https://unsplash.com/collections/1065976', True),
+  ('https://unsplash.com/s/photos/starry-sky', True),
+  ('https://unsplash.com/@stargazer', True),
+  ('https://unsplash.com/photos/aB1cD2eF3gH', False),
+  ('https://www.pexels.com/search/starry%20sky/', False),
+])
+def test_unsplash_match_list_url(url, expected):
+  assert bool(UnsplashWallpaperSpecResolver().match_list_url(url)) == expected
+
+
+def test_unsplash_search(api):
+  api.add('https://api.unsplash.com/search/photos', 1, load_fixture('unsplash-search.json'))
+  specs = list(UnsplashWallpaperSpecResolver().resolve_list('https://unsplash.com/s/photos/starry-sky'))
+
+  # Fewer results than the page size, so there is no request for a second page.
+  assert api.calls == [('https://api.unsplash.com/search/photos',
+    {'query': 'starry sky', 'page': 1, 'per_page': 30})]
+  assert [x.source_url for x in specs] == [
+    'https://unsplash.com/photos/aB1cD2eF3gH',
+    'https://unsplash.com/photos/iJ4kL5mN6oP',
+    'https://unsplash.com/photos/qR7sT8uV9wX',
+  ]
+  # Photo tags take precedence, the search terms are the fallback.
+  assert [x.keywords for x in specs] == [['milky way', 'galaxy'], ['starry', 'sky'], ['starry', 'sky']]
+  assert specs[1].name == 'unsplash-iJ4kL5mN6oP'
+  assert specs[0].credit.author == 'Stargazer'
+
+  image = specs[0].resolutions[1]
+  assert (image.width, image.height) == (1080, 720)
+  assert image.filename == 'starry-night-over-the-mountains-1080-720.jpeg'
+
+
+@pytest.mark.parametrize('url,api_url', [
+  ('https://unsplash.com/collections/1065976/wallpapers', 'https://api.unsplash.com/collections/1065976/photos'),
+  ('https://unsplash.com/@woods', 'https://api.unsplash.com/users/woods/photos'),
+])
+def test_unsplash_list_pages(api, monkeypatch, url, api_url):
+  monkeypatch.setattr(UnsplashWallpaperSpecResolver, '_per_page', 3)
+  photos = load_fixture('unsplash-photos.json')
+  api.add(api_url, 1, photos[:3])
+  api.add(api_url, 2, photos[3:])
+  specs = list(UnsplashWallpaperSpecResolver().resolve_list(url))
+
+  assert [x[1]['page'] for x in api.calls] == [1, 2]
+  assert all(x[0] == api_url for x in api.calls)
+  assert [x.name for x in specs] == ['green forest', 'sandy beach', 'snowy peak', 'city lights']
+  assert all(x.keywords == [] for x in specs)
+
+
+def test_unsplash_list_limit(api, monkeypatch):
+  monkeypatch.setattr(UnsplashWallpaperSpecResolver, '_per_page', 3)
+  api_url = 'https://api.unsplash.com/collections/1065976/photos'
+  api.add(api_url, 1, load_fixture('unsplash-photos.json')[:3])
+  specs = list(UnsplashWallpaperSpecResolver().resolve_list(
+    'https://unsplash.com/collections/1065976', limit=3))
+
+  # The limit is reached with the first page, the second page is never requested.
+  assert len(specs) == 3
+  assert len(api.calls) == 1
+
+
+def test_unsplash_list_errors(api, monkeypatch):
+  resolver = UnsplashWallpaperSpecResolver()
+  with pytest.raises(requests.HTTPError):
+    list(resolver.resolve_list('https://unsplash.com/collections/404'))
+
+  monkeypatch.delenv('UNSPLASH_ACCESS_KEY')
+  with pytest.raises(EnvironmentError):
+    list(resolver.resolve_list('https://unsplash.com/collections/1065976'))
+
+
+@pytest.mark.parametrize('url,expected', [
+  ('https://www.pexels.com/search/starry%20sky/', True),
+  ('https://www.pexels.com/collections/wallpapers-mslc6lw/', True),
+  ('https://www.pexels.com/collections/mslc6lw', True),
+  ('https://www.pexels.com/photo/milky-way-galaxy-1252890/', False),
+  ('https://unsplash.com/collections/1065976', False),
+])
+def test_pexels_match_list_url(url, expected):
+  assert bool(PexelsWallpaperSpecResolver().match_list_url(url)) == expected
+
+
+def test_pexels_search_follows_next_page(api):
+  api.add('https://api.pexels.com/v1/search', 1, load_fixture('pexels-search.json'))
+  api.add('https://api.pexels.com/v1/search', 2, load_fixture('pexels-search-2.json'))
+  specs = list(PexelsWallpaperSpecResolver().resolve_list('https://www.pexels.com/search/starry%20sky/'))
+
+  assert api.calls == [
+    ('https://api.pexels.com/v1/search', {'query': 'starry sky', 'page': 1, 'per_page': 80}),
+    ('https://api.pexels.com/v1/search', {'query': 'starry sky', 'page': 2, 'per_page': 80}),
+  ]
+  assert [x.name for x in specs] == [
+    'silhouette-of-trees-under-starry-sky', 'milky-way-galaxy', 'northern-lights']
+  assert all(x.keywords == ['starry', 'sky'] for x in specs)
+  assert specs[0].credit.author == 'Hristo Fidanov'
+
+  original = specs[0].resolutions[0]
+  assert (original.width, original.height) == (4000, 6000)
+  assert original.filename == 'silhouette-of-trees-under-starry-sky-4000-6000.jpeg'
+
+
+def test_pexels_collection_skips_videos(api):
+  api_url = 'https://api.pexels.com/v1/collections/mslc6lw'
+  api.add(api_url, 1, load_fixture('pexels-collection.json'))
+  specs = list(PexelsWallpaperSpecResolver().resolve_list(
+    'https://www.pexels.com/collections/wallpapers-mslc6lw/'))
+
+  # There is no next page, so the collection ends after the first request.
+  assert api.calls == [(api_url, {'type': 'photos', 'page': 1, 'per_page': 80})]
+  assert [x.name for x in specs] == ['green-mountain', 'lake-between-mountains']
+  assert all(x.keywords == [] for x in specs)
+
+
+def test_pexels_list_limit(api):
+  api.add('https://api.pexels.com/v1/search', 1, load_fixture('pexels-search.json'))
+  specs = list(PexelsWallpaperSpecResolver().resolve_list(
+    'https://www.pexels.com/search/starry%20sky/', limit=2))
+
+  assert len(specs) == 2
+  assert len(api.calls) == 1
@@ -0,0 +1,82 @@
+from aiad_cli.core import ImageCredit, ImageWithResolution, WallpaperSpec
+from aiad_cli.database import WallpapersDatabase
+from aiad_cli.sync import GitError, sync
+from aiad_cli.sync.index import IndexSyncTarget
+import datetime
+import json
+import os
+import pytest
+import shutil
+import subprocess
+
+pytestmark = pytest.mark.skipif(not shutil.which('git'), reason='git is not installed')
+
+
+def make_spec(name):
+  image = ImageWithResolution(1080, 1920, 'https://example.org/{}.jpeg'.format(name), name + '.jpeg')
+  return WallpaperSpec(
+    name=name,
+    keywords=['test'],
+    source_url='https://example.org/' + name,
+    credit=ImageCredit('Test', 'Tester', 'https://example.org/tester'),
+    resolutions=[image],
+  )
+
+
+def git(repo, *args):
+  subprocess.check_call(['git', '-c', 'user.name=Test', '-c', 'user.email=test@example.org']
+    + list(args), cwd=str(repo), stdout=subprocess.DEVNULL)
+
+
+def load_index(output):
+  with open(os.path.join(output, 'General', 'index.json')) as fp:
+    return json.load(fp)
+
+
+def test_sync_applies_committed_changes(tmp_path):
+  repo = tmp_path / 'repo'
+  output = str(tmp_path / 'build')
+  db = WallpapersDatabase(str(repo / 'Wallpapers' / 'General'))
+  targets = {'index': IndexSyncTarget(output)}
+
+  git(tmp_path, 'init', '-q', 'repo')
+  db.save(datetime.date(2020, 6, 1), make_spec('first'))
+  db.save(datetime.date(2020, 6, 2), make_spec('second'))
+  git(repo, 'add', '-A')
+  git(repo, 'commit', '-q', '-m', 'initial')
+
+  assert sync(str(repo), output, targets) == {'index': None}
+  assert load_index(output) == {
+    '2020-06-01': '2020/06/01-first.json',
+    '2020-06-02': '2020/06/02-second.json',
+  }
+
+  # Rename the first spec by saving it under a new name and delete the second one.
+  db.save(datetime.date(2020, 6, 1), make_spec('renamed'))
+  db.delete(datetime.date(2020, 6, 2))
+  git(repo, 'add', '-A')
+  git(repo, 'commit', '-q', '-m', 'rename and delete')
+
+  changes = sync(str(repo), output, targets)['index']
+  assert sorted((x.status, x.filename) for x in changes) == [
+    ('A', 'Wallpapers/General/2020/06/01-renamed.json'),
+    ('D', 'Wallpapers/General/2020/06/01-first.json'),
+    ('D', 'Wallpapers/General/2020/06/02-second.json'),
+  ]
+  assert load_index(output) == {'2020-06-01': '2020/06/01-renamed.json'}
+
+  assert sync(str(repo), output, targets) == {'index': []}
+
+
+def test_sync_refuses_uncommitted_changes(tmp_path):
+  repo = tmp_path / 'repo'
+  db = WallpapersDatabase(str(repo / 'Wallpapers' / 'General'))
+  git(tmp_path, 'init', '-q', 'repo')
+  db.save(datetime.date(2020, 6, 1), make_spec('first'))
+  git(repo, 'add', '-A')
+  git(repo, 'commit', '-q', '-m', 'initial')
+
+  db.save(datetime.date(2020, 6, 2), make_spec('second'))
+  output = str(tmp_path / 'build')
+  with pytest.raises(GitError):
+    sync(str(repo), output, {'index': IndexSyncTarget(output)})
@@ -73,6 +73,9 @@ get_image_url_and_filename() {
   local RESOLUTION="$1"
   IMAGE_URL=`cat "$SPEC_FILENAME" | jq '.resolution_aliases."'"$RESOLUTION"'".image_url' -r`
   FILENAME=`cat "$SPEC_FILENAME" | jq '.resolution_aliases."'"$RESOLUTION"'".filename' -r`
+  IMAGE_SIZE=`cat "$SPEC_FILENAME" | jq '.resolution_aliases."'"$RESOLUTION"'".size // empty' -r`
+  IMAGE_SHA256=`cat "$SPEC_FILENAME" | jq '.resolution_aliases."'"$RESOLUTION"'".sha256 // empty' -r`
+  IMAGE_ETAG=`cat "$SPEC_FILENAME" | jq '.resolution_aliases."'"$RESOLUTION"'".etag // empty' -r`
   if [ "$IMAGE_URL" == "null" ] || [ "$FILENAME" == "null" ]; then
     return 1
   fi
@@ -86,13 +89,59 @@ if ! get_image_url_and_filename "$RESOLUTION"; then
   fi
 fi
 
+file_size() {
+  wc -c < "$1" | tr -d ' '
+}
+
+file_sha256() {
+  if command -v sha256sum >/dev/null; then
+    sha256sum "$1" | cut -d ' ' -f 1
+  else
+    shasum -a 256 "$1" | cut -d ' ' -f 1
+  fi
+}
+
 FILENAME="${DATE//\//-}-$FILENAME"
 OUTPUT_FILENAME="$DIRECTORY/$FILENAME"
-if [ $OVERWRITE = false ] && [ -e "$OUTPUT_FILENAME" ]; then
+if [ $OVERWRITE = false ] && [ -e "$OUTPUT_FILENAME" ] && \
+    ( [ -z "$IMAGE_SIZE" ] || [ "$(file_size "$OUTPUT_FILENAME")" = "$IMAGE_SIZE" ] ); then
   [ $QUIET = false ] && echo >&2 "note: file \"$OUTPUT_FILENAME\" already exists."
 else
   mkdir -p "$DIRECTORY"
-  curl -s "$IMAGE_URL" -o "$OUTPUT_FILENAME"
+  PARTIAL_FILENAME="$OUTPUT_FILENAME.part"
+  # A partial download can only be resumed safely if the server can tell us with the ETag
+  # whether the image changed in the meantime. If it did, or if the server does not support
+  # ranges, curl fails instead of appending to the file and we start over.
+  if [ $OVERWRITE = true ] || [ -z "$IMAGE_SIZE" ] || [ -z "$IMAGE_ETAG" ]; then
+    rm -f -- "$PARTIAL_FILENAME"
+  fi
+  if [ -e "$PARTIAL_FILENAME" ] && \
+      ! curl -s -f -C - -H "If-Range: $IMAGE_ETAG" "$IMAGE_URL" -o "$PARTIAL_FILENAME"; then
+    [ $QUIET = false ] && echo >&2 "note: could not resume download of \"$IMAGE_URL\", starting over."
+    rm -f -- "$PARTIAL_FILENAME"
+  fi
+  if ! [ -e "$PARTIAL_FILENAME" ] && ! curl -s -f "$IMAGE_URL" -o "$PARTIAL_FILENAME"; then
+    >&2 echo "error: failed to download \"$IMAGE_URL\"."
+    if [ -z "$IMAGE_SIZE" ] || [ -z "$IMAGE_ETAG" ]; then
+      rm -f -- "$PARTIAL_FILENAME"
+    fi
+    exit 1
+  fi
+  if [ -n "$IMAGE_SIZE" ] && [ "$(file_size "$PARTIAL_FILENAME")" != "$IMAGE_SIZE" ]; then
+    if [ -n "$IMAGE_ETAG" ]; then
+      >&2 echo "error: incomplete download of \"$IMAGE_URL\", run again to resume."
+    else
+      rm -f -- "$PARTIAL_FILENAME"
+      >&2 echo "error: incomplete download of \"$IMAGE_URL\"."
+    fi
+    exit 1
+  fi
+  if [ -n "$IMAGE_SHA256" ] && [ "$(file_sha256 "$PARTIAL_FILENAME")" != "$IMAGE_SHA256" ]; then
+    rm -f -- "$PARTIAL_FILENAME"
+    >&2 echo "error: SHA-256 mismatch for \"$IMAGE_URL\"."
+    exit 1
+  fi
+  mv -- "$PARTIAL_FILENAME" "$OUTPUT_FILENAME"
 fi
 
 mkdir -p "$DIRECTORY/Today"